@@ -0,0 +1,151 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import json
+import os
+import platform
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_spec import add_shape_arguments, generate_spec, shape_from_args
+import main
+from writer.code_writer import BASE_PACKAGE_NAME, CodeWriter, type_path
+from writer.manifest import Manifest
+from writer.output import DirectoryOutput
+
+PHASES = [
+    "spec_load",
+    "add_type",
+    "add_method",
+    "types_resolution",
+    "type_to_java_code",
+    "build_java_class",
+    "file_writes",
+]
+
+
+def run_once(spec_path: str) -> dict[str, float]:
+    timings: dict[str, float] = {}
+
+    start = perf_counter()
+    with open(spec_path, "r") as file:
+        specs = json.load(file)
+    timings["spec_load"] = perf_counter() - start
+
+    with TemporaryDirectory() as outdir:
+        writer = CodeWriter(outdir + "/")
+
+        start = perf_counter()
+        main.add_datatypes(writer, specs)
+        main.add_method_params(writer, specs)
+        timings["add_type"] = perf_counter() - start
+
+        start = perf_counter()
+        main.add_methods(writer, specs)
+        timings["add_method"] = perf_counter() - start
+
+        start = perf_counter()
+        types = writer.type_geneartor.types()
+        writer.method_generator.set_types(types)
+        timings["types_resolution"] = perf_counter() - start
+
+        start = perf_counter()
+        files = {type_path(type_): type_.to_java_code(BASE_PACKAGE_NAME) for type_ in types}
+        timings["type_to_java_code"] = perf_counter() - start
+
+        start = perf_counter()
+        files["core/BotApi.java"] = writer.method_generator.build_java_class(BASE_PACKAGE_NAME)
+        timings["build_java_class"] = perf_counter() - start
+
+        start = perf_counter()
+        output = DirectoryOutput(outdir)
+        output.begin()
+        for path, content in files.items():
+            output.write(path, content)
+        output.commit(Manifest(outdir), Manifest(outdir))
+        timings["file_writes"] = perf_counter() - start
+
+    return timings
+
+
+def summarize(runs: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    summary = {}
+    for phase in PHASES:
+        values = [run[phase] for run in runs]
+        summary[phase] = {"min": min(values), "median": median(values), "max": max(values)}
+    return summary
+
+
+def load_baseline(baseline_path: str) -> dict:
+    with open(baseline_path, "r") as file:
+        return json.load(file)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for phase in PHASES:
+        old = baseline["phases"].get(phase, {}).get("median")
+        new = results["phases"][phase]["median"]
+        if not old:
+            continue
+
+        ratio = new / old
+        print(f"{phase:20} {old * 1000:10.2f} ms -> {new * 1000:10.2f} ms ({ratio:.2f}x)")
+        if ratio > 1 + threshold:
+            regressions.append(phase)
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmarks the generator on a synthetic spec.")
+    add_shape_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of runs, each in a fresh interpreter")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="JSON file for the results")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed relative slowdown of a phase median when comparing")
+    args = parser.parse_args()
+
+    shape = shape_from_args(args)
+    # Read before the results are written, as --output may point to the baseline itself.
+    baseline = load_baseline(args.compare) if args.compare is not None else None
+
+    with TemporaryDirectory() as tmpdir:
+        spec_path = os.path.join(tmpdir, "api.json")
+        with open(spec_path, "w") as file:
+            json.dump(generate_spec(shape), file)
+
+        runs = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                runs.append(executor.submit(run_once, spec_path).result())
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "shape": shape.as_dict(),
+        "repeat": args.repeat,
+        "phases": summarize(runs),
+        "total_median": sum(median(run[phase] for run in runs) for phase in PHASES),
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+        file.write("\n")
+
+    for phase in PHASES:
+        print(f"{phase:20} {results['phases'][phase]['median'] * 1000:10.2f} ms")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            sys.exit(1)
@@ -0,0 +1,158 @@
+from argparse import ArgumentParser
+from random import Random
+import json
+
+PRIMITIVE_TYPES = ["Integer", "String", "Boolean", "Float"]
+
+
+class SpecShape:
+    types: int
+    fields_per_type: int
+    methods: int
+    subtype_fanout: int
+    nesting_depth: int
+    input_file_ratio: float
+    seed: int
+
+    def __init__(self, types: int = 300, fields_per_type: int = 8, methods: int = 150,
+                 subtype_fanout: int = 4, nesting_depth: int = 4, input_file_ratio: float = 0.1,
+                 seed: int = 0) -> None:
+        self.types = types
+        self.fields_per_type = fields_per_type
+        self.methods = methods
+        self.subtype_fanout = subtype_fanout
+        self.nesting_depth = nesting_depth
+        self.input_file_ratio = input_file_ratio
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def make_field(name: str, types: list[str], required: bool, description: str = "") -> dict:
+    return {
+        "name": name,
+        "types": types,
+        "required": required,
+        "description": description or f"Synthetic field {name}.",
+    }
+
+
+def generate_spec(shape: SpecShape) -> dict:
+    random = Random(shape.seed)
+    depth = max(1, shape.nesting_depth)
+    type_names = [f"SyntheticType{i}" for i in range(shape.types)]
+    levels = [type_names[level::depth] for level in range(depth)]
+    level_of = {name: level for level, names in enumerate(levels) for name in names}
+
+    types: dict[str, dict] = {}
+    for name in type_names:
+        fields = []
+        level = level_of[name]
+        for i in range(shape.fields_per_type):
+            field_types = [random.choice(PRIMITIVE_TYPES)]
+            if i == 0 and level + 1 < depth and levels[level + 1]:
+                inner = random.choice(levels[level + 1])
+                field_types = [inner if random.random() < 0.5 else "Array of " + inner]
+            elif i == 1 and random.random() < shape.input_file_ratio:
+                field_types = ["InputFile", "String"]
+            fields.append(make_field(f"field_{i}", field_types, random.random() < 0.5))
+
+        types[name] = {
+            "name": name,
+            "href": f"https://example.org/{name.lower()}",
+            "description": [f"Synthetic type {name}."],
+            "fields": fields,
+        }
+
+    supertypes: list[str] = []
+    if shape.subtype_fanout > 1:
+        for group, start in enumerate(range(0, len(type_names) - shape.subtype_fanout + 1, shape.subtype_fanout * 2)):
+            subtypes = type_names[start:start + shape.subtype_fanout]
+            name = f"SyntheticSupertype{group}"
+            for subtype in subtypes:
+                types[subtype]["subtype_of"] = [name]
+            types[name] = {
+                "name": name,
+                "href": f"https://example.org/{name.lower()}",
+                "description": [f"Synthetic supertype {name}."],
+                "subtypes": subtypes,
+            }
+            supertypes.append(name)
+
+    types["InputFile"] = {
+        "name": "InputFile",
+        "href": "https://example.org/inputfile",
+        "description": ["This object represents the contents of a file to be uploaded."],
+    }
+
+    # Unions of one field name share a grouped interface, so each name gets one fixed union,
+    # as in the real spec (e.g. reply_markup).
+    unions: dict[str, list[str]] = {}
+
+    methods: dict[str, dict] = {}
+    for i in range(shape.methods):
+        name = f"syntheticMethod{i}"
+        fields = [make_field("chat_id", ["Integer", "String"], True)]
+        for j in range(shape.fields_per_type - 1):
+            roll = random.random()
+            if roll < shape.input_file_ratio:
+                field_types = ["InputFile", "String"]
+            elif roll < 0.3 and supertypes:
+                field_types = [random.choice(supertypes)]
+            elif roll < 0.4 and len(type_names) >= 3:
+                if f"param_{j}" not in unions:
+                    unions[f"param_{j}"] = random.sample(type_names, 3)
+                field_types = unions[f"param_{j}"]
+            elif roll < 0.6 and type_names:
+                field_types = [random.choice(type_names)]
+            else:
+                field_types = [random.choice(PRIMITIVE_TYPES)]
+            fields.append(make_field(f"param_{j}", field_types, random.random() < 0.3))
+
+        returns = ["Boolean"]
+        if type_names:
+            returns = random.choice([["Boolean"], [random.choice(type_names)],
+                                     ["Array of " + random.choice(type_names)]])
+
+        methods[name] = {
+            "name": name,
+            "href": f"https://example.org/{name.lower()}",
+            "description": [f"Synthetic method {name}."],
+            "returns": returns,
+            "fields": fields,
+        }
+
+    return {
+        "version": "Synthetic",
+        "release_date": "",
+        "changelog": "",
+        "methods": methods,
+        "types": types,
+    }
+
+
+def add_shape_arguments(parser: ArgumentParser) -> None:
+    defaults = SpecShape()
+    parser.add_argument("--types", type=int, default=defaults.types)
+    parser.add_argument("--fields-per-type", type=int, default=defaults.fields_per_type)
+    parser.add_argument("--methods", type=int, default=defaults.methods)
+    parser.add_argument("--subtype-fanout", type=int, default=defaults.subtype_fanout)
+    parser.add_argument("--nesting-depth", type=int, default=defaults.nesting_depth)
+    parser.add_argument("--input-file-ratio", type=float, default=defaults.input_file_ratio)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def shape_from_args(args) -> SpecShape:
+    return SpecShape(args.types, args.fields_per_type, args.methods, args.subtype_fanout,
+                     args.nesting_depth, args.input_file_ratio, args.seed)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Writes a synthetic api.json shaped spec.")
+    parser.add_argument("output", help="path of the generated spec")
+    add_shape_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.output, "w") as file:
+        json.dump(generate_spec(shape_from_args(args)), file, indent=2)
@@ -0,0 +1,15 @@
+class CodeEmitter:
+    parts: list[str]
+
+    def __init__(self) -> None:
+        self.parts = []
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+
+    def lines(self, lines: list[str]) -> None:
+        if lines:
+            self.parts.append("\n".join(lines) + "\n")
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
@@ -1,63 +1,15 @@
-from generators.constants import ARRAY_OF
+from hashlib import sha256
+from typing import Mapping
+import json
+import re
+
+from generators.spec_view import thaw
+from generators.type_mapping import TYPE_MAPPER
 from .imports import Imports
 
 
 def map_type(original_types: list[str], required: bool, field_description: str = "") -> tuple[str, set[str]]:
-    return_value = {
-        True: {
-            "True": "boolean",
-            "Float number": "float",
-            "Integer": "int",
-            "Boolean": "boolean",
-            "Float": "float",
-            "Long": "long",
-        },
-        False: {
-            "True": "Boolean",
-            "Float number": "Float",
-        }
-    }
-
-    def map_array_type(original_type: str) -> tuple[str, set[str]]:
-        level = 0
-        while original_type.startswith(ARRAY_OF):
-            level += 1
-            original_type = original_type[len(ARRAY_OF):]
-
-        original_type = return_value[False][original_type] if original_type in return_value[False] else original_type
-        for _ in range(level):
-            original_type = f"List<{original_type}>"
-
-        return (original_type, {Imports.List.as_line()})
-
-    def handle_type_by_description(original_type: str, description: str) -> str:
-        if "attach://" in description and original_type == "String":
-            original_type = "InputFile"
-
-        if "64 bit" in field_description or "64-bit" in description and original_type == "Integer":
-            original_type = "Long"
-
-        return original_type
-
-    if len(original_types) == 1:
-        original_type = original_types[0]
-        original_type = handle_type_by_description(original_type, field_description)
-
-        if original_type in return_value[required]:
-            return (return_value[required][original_type], set())
-        if original_type.startswith(ARRAY_OF):
-            return map_array_type(original_type)
-
-        return (original_type, set())
-
-    if original_types == ["Integer", "String"]:
-        return ("Id", set())
-    if original_types == ["InputFile", "String"]:
-        return ("InputFile", set())
-    if original_types == ["Message", "Boolean"]:
-        return ("MessageOrBoolean", {Imports.MessageOrBoolean.as_line()})
-
-    raise Exception(f"Unknown type: {original_types}!")
+    return TYPE_MAPPER.map(original_types, required, field_description)
 
 
 def unwrap_type(original_type: str) -> str:
@@ -89,13 +41,22 @@ def to_pascal_case(field_name: str) -> str:
     return "".join(map(lambda word: word[0].upper() + word[1:], words))
 
 
+def to_constant_case(name: str) -> str:
+    return re.sub("(?<=[a-z0-9])(?=[A-Z])", "_", name).upper()
+
+
 def generate_description(phrases: list[str], indent_spaces: int) -> str:
     indent = " " * indent_spaces
-    description = f"{indent}/**\n"
-    last = len(phrases) - 1
-    for i, phrase in enumerate(phrases):
-        description += f"{indent}* {phrase}\n"
-        if i != last:
-            description += f"{indent}*\n"
-    description += "*/\n"
-    return description
+    separator = f"\n{indent}*\n{indent}* "
+    body = separator.join(phrases)
+    if not phrases:
+        return f"{indent}/**\n*/\n"
+    return f"{indent}/**\n{indent}* {body}\n*/\n"
+
+
+def hash_content(content: str) -> str:
+    return sha256(content.encode("utf-8")).hexdigest()
+
+
+def hash_spec(spec: Mapping | list) -> str:
+    return hash_content(json.dumps(spec, sort_keys=True, ensure_ascii=False, default=thaw))
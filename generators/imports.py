@@ -1,13 +1,31 @@
 from enum import Enum
 
+BASE_PACKAGE_PLACEHOLDER = "{base_packagename}"
+
+
 class Imports(Enum):
     SerializedName = "import com.google.gson.annotations.SerializedName;"
+    Gson = "import com.google.gson.Gson;"
+    TypeAdapter = "import com.google.gson.TypeAdapter;"
+    TypeToken = "import com.google.gson.reflect.TypeToken;"
+    JsonReader = "import com.google.gson.stream.JsonReader;"
+    JsonToken = "import com.google.gson.stream.JsonToken;"
+    JsonWriter = "import com.google.gson.stream.JsonWriter;"
+    IOException = "import java.io.IOException;"
     Objects = "import java.util.Objects;"
     List = "import java.util.List;"
-    MessageOrBoolean = "import jarkz.tbot.types.MessageOrBoolean;"
-    Id = "import jarkz.tbot.types.Id;"
-    NotNull = "import jarkz.tbot.types.annotations.NotNull;"
-    InputFile = "import jarkz.tbot.types.InputFile;"
+    MessageOrBoolean = "import {base_packagename}.types.MessageOrBoolean;"
+    Id = "import {base_packagename}.types.Id;"
+    NotNull = "import {base_packagename}.types.annotations.NotNull;"
+    InputFile = "import {base_packagename}.types.InputFile;"
 
     def as_line(self) -> str:
         return self.value
+
+
+def import_line(package: str, name: str) -> str:
+    return f"import {BASE_PACKAGE_PLACEHOLDER}.{package}.{name};"
+
+
+def render_imports(imports: set[str], base_packagename: str) -> list[str]:
+    return sorted(map(lambda line: line.replace(BASE_PACKAGE_PLACEHOLDER, base_packagename), imports))
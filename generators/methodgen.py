@@ -1,10 +1,11 @@
 from enum import Enum
-from functools import reduce
-from typing import Iterable, cast
-from generators.constants import EMPTY_LINE
-from generators.helpers import generate_description, map_type, to_pascal_case, unwrap_type
-from generators.imports import Imports
-from generators.typegen import Type, TypeClassification
+from time import perf_counter
+from typing import Mapping, cast
+from generators.emitter import CodeEmitter
+from generators.profiler import DISABLED_PROFILER, Profiler
+from generators.helpers import generate_description, hash_content, hash_spec, map_type, to_constant_case, to_pascal_case, unwrap_type
+from generators.imports import Imports, render_imports
+from generators.typegen import DEFAULT_DYNAMIC_IMPORTS, HANDWRITTEN_DEPENDENCIES, Field, OutputMode, Type, TypeClassification, TypeRegistry
 
 PACKAGE = "core"
 
@@ -12,24 +13,43 @@ IMPORTS = {
     "import com.google.common.reflect.TypeToken;",
     "import com.google.gson.Gson;",
     "import com.google.gson.GsonBuilder;",
-    "import com.google.gson.annotations.SerializedName;",
+    "import com.google.gson.TypeAdapter;",
+    "import com.google.gson.TypeAdapterFactory;",
+    "import com.google.gson.stream.JsonReader;",
+    "import java.io.ByteArrayOutputStream;",
     "import java.io.IOException;",
-    "import java.lang.reflect.Field;",
+    "import java.io.InputStream;",
+    "import java.io.InputStreamReader;",
+    "import java.io.PipedInputStream;",
+    "import java.io.PipedOutputStream;",
+    "import java.io.UncheckedIOException;",
     "import java.net.URI;",
+    "import java.net.http.HttpClient;",
+    "import java.net.http.HttpRequest;",
+    "import java.net.http.HttpResponse;",
     "import java.nio.charset.Charset;",
-    "import java.util.LinkedList;",
-    "import java.util.Set;",
-    "import java.util.function.Consumer;",
+    "import java.nio.charset.StandardCharsets;",
+    "import java.time.Duration;",
+    "import java.util.ArrayList;",
+    "import java.util.HashMap;",
+    "import java.util.Map;",
+    "import java.util.concurrent.CompletableFuture;",
+    "import java.util.concurrent.Executor;",
+    "import java.util.concurrent.ForkJoinPool;",
+    "import java.util.concurrent.TimeUnit;",
+    "import java.util.function.Function;",
     "import org.apache.http.HttpEntity;",
-    "import org.apache.http.HttpResponse;",
+    "import org.apache.http.client.config.RequestConfig;",
+    "import org.apache.http.client.methods.CloseableHttpResponse;",
     "import org.apache.http.client.methods.HttpPost;",
     "import org.apache.http.entity.ContentType;",
     "import org.apache.http.entity.StringEntity;",
     "import org.apache.http.entity.mime.MultipartEntityBuilder;",
     "import org.apache.http.impl.client.CloseableHttpClient;",
     "import org.apache.http.impl.client.HttpClients;",
-    Imports.Id.as_line(),
+    "import org.apache.http.impl.conn.PoolingHttpClientConnectionManager;",
     Imports.InputFile.as_line(),
+    Imports.List.as_line(),
 }
 
 CLASSNAME = "BotApi"
@@ -49,10 +69,21 @@ CLASS_DOCUMENTATION = [
     " *",
     " * <pre><code>",
     " * var token = \"your_token\";",
-    " * var api = new BotApi(token);",
-    " * var params = new GetUpdatesParameters();",
-    " * {@link Update}[] updates = api.getUpdates(params);",
+    " * try (var api = new BotApi(token)) {",
+    " *   var params = new GetUpdatesParameters();",
+    " *   {@link Update}[] updates = api.getUpdates(params);",
+    " * }",
     " * </code></pre>",
+    " *",
+    " * <p>One instance keeps a pool of HTTP connections to the Telegram API, so create it once, share",
+    " * it between threads and close it when the application stops. The pool size, timeouts and",
+    " * keep-alive can be changed with {@link ClientOptions}.",
+    " *",
+    " * <p>Every method has an asynchronous twin with the \"Async\" suffix (e.g. \"sendMessageAsync\"),",
+    " * which returns a {@link CompletableFuture} and never blocks the calling thread. Parameters are",
+    " * serialized and results are parsed on the executor set by {@link",
+    " * ClientOptions#setExecutor(Executor)}. Files of asynchronous uploads are streamed to the API by",
+    " * a separate thread per request, so they are never held in memory as a whole.",
     " */",
 ]
 
@@ -63,223 +94,324 @@ DEFAULT_LINES_AT_START = [
     "    gson = registerAllAdapters();",
     "  }",
     "",
-    "  private static final Set<Class<?>> DEFAULT_TYPES =",
-    "      Set.of(",
-    "          String.class,",
-    "          Short.class,",
-    "          Integer.class,",
-    "          Long.class,",
-    "          Float.class,",
-    "          Double.class,",
-    "          Character.class,",
-    "          Boolean.class,",
-    "          Byte.class,",
-    "          Short.TYPE,",
-    "          Integer.TYPE,",
-    "          Long.TYPE,",
-    "          Float.TYPE,",
-    "          Double.TYPE,",
-    "          Character.TYPE,",
-    "          Boolean.TYPE,",
-    "          Byte.TYPE);",
-    "",
-    "  private static final Set<Class<?>> SPECIFIC_TYPES = Set.of(Id.class, MessageOrBoolean.class);"
-    "",
-    "",
     "  private static Gson registerAllAdapters() {",
     "    return new GsonBuilder()",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.BotCommandScope.class,",
-    "            new jarkz.tbot.types.deserializers.BotCommandScopeDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.ChatMember.class,",
-    "            new jarkz.tbot.types.deserializers.ChatMemberDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.MenuButton.class,",
-    "            new jarkz.tbot.types.deserializers.MenuButtonDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.MessageOrigin.class,",
-    "            new jarkz.tbot.types.deserializers.MessageOriginDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.ReactionType.class,",
-    "            new jarkz.tbot.types.deserializers.ReactionTypeDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.MaybeInaccessibleMessage.class,",
-    "            new jarkz.tbot.types.deserializers.MaybeInaccessibleMessageDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.ChatBoostSource.class,",
-    "            new jarkz.tbot.types.deserializers.ChatBoostSourceDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.PassportElementError.class,",
-    "            new jarkz.tbot.types.deserializers.PassportElementErrorDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.MessageOrBoolean.class,",
-    "            new jarkz.tbot.types.deserializers.MessageOrBooleanDeserializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.Id.class,",
-    "            new jarkz.tbot.types.serializers.IdSerializer())",
-    "        .registerTypeAdapter(",
-    "            jarkz.tbot.types.InputFile.class,",
-    "            new jarkz.tbot.types.serializers.InputFileSerializer())",
+]
+
+TYPE_ADAPTERS = [
+    ("BotCommandScope", "deserializers.BotCommandScopeDeserializer"),
+    ("ChatMember", "deserializers.ChatMemberDeserializer"),
+    ("MenuButton", "deserializers.MenuButtonDeserializer"),
+    ("MessageOrigin", "deserializers.MessageOriginDeserializer"),
+    ("ReactionType", "deserializers.ReactionTypeDeserializer"),
+    ("MaybeInaccessibleMessage", "deserializers.MaybeInaccessibleMessageDeserializer"),
+    ("ChatBoostSource", "deserializers.ChatBoostSourceDeserializer"),
+    ("PassportElementError", "deserializers.PassportElementErrorDeserializer"),
+    ("MessageOrBoolean", "deserializers.MessageOrBooleanDeserializer"),
+    ("Id", "serializers.IdSerializer"),
+    ("InputFile", "serializers.InputFileSerializer"),
+]
+
+DEFAULT_LINES_AFTER_ADAPTERS = [
     "        .create();",
     "  }",
     "",
+    "  private static final int UPLOAD_PIPE_SIZE = 64 * 1024;",
+    "",
     "  private final String botToken;",
     "",
     "  private final String urlTemplate = \"https://api.telegram.org/bot%s/%s\";",
     "",
+    "  private final CloseableHttpClient client;",
+    "",
+    "  private final HttpClient asyncClient;",
+    "",
+    "  private final Executor executor;",
+    "",
+    "  private final Duration requestTimeout;",
+    "",
+    "  private final Map<String, URI> uris;",
+    "",
     "  public BotApi(String botToken) {",
+    "    this(botToken, new ClientOptions());",
+    "  }",
+    "",
+    "  public BotApi(String botToken, ClientOptions options) {",
+    "    this(botToken, options.createClient(), options);",
+    "  }",
+    "",
+    "  public BotApi(String botToken, CloseableHttpClient client) {",
+    "    this(botToken, client, new ClientOptions());",
+    "  }",
+    "",
+    "  private BotApi(String botToken, CloseableHttpClient client, ClientOptions options) {",
     "    this.botToken = botToken;",
+    "    this.client = client;",
+    "    this.asyncClient = options.createAsyncClient();",
+    "    this.executor = options.executor;",
+    "    this.requestTimeout = Duration.ofMillis(options.socketTimeoutMillis);",
+    "    this.uris = createUris(botToken);",
+    "  }",
+    "",
+    "  private Map<String, URI> createUris(String botToken) {",
+    "    var uris = new HashMap<String, URI>(METHOD_NAMES.length * 2);",
+    "    for (var methodName : METHOD_NAMES) {",
+    "      uris.put(methodName, URI.create(String.format(urlTemplate, botToken, methodName)));",
+    "    }",
+    "    return Map.copyOf(uris);",
+    "  }",
+    "",
+    "  public static final class ClientOptions {",
+    "",
+    "    private int maxConnections = 20;",
+    "    private int connectTimeoutMillis = 10_000;",
+    "    private int connectionRequestTimeoutMillis = 10_000;",
+    "    private int socketTimeoutMillis = 75_000;",
+    "    private long keepAliveMillis = 30_000;",
+    "    private Executor executor = ForkJoinPool.commonPool();",
+    "",
+    "    public ClientOptions setMaxConnections(int maxConnections) {",
+    "      this.maxConnections = maxConnections;",
+    "      return this;",
+    "    }",
+    "",
+    "    public ClientOptions setConnectTimeoutMillis(int connectTimeoutMillis) {",
+    "      this.connectTimeoutMillis = connectTimeoutMillis;",
+    "      return this;",
+    "    }",
+    "",
+    "    public ClientOptions setConnectionRequestTimeoutMillis(int connectionRequestTimeoutMillis) {",
+    "      this.connectionRequestTimeoutMillis = connectionRequestTimeoutMillis;",
+    "      return this;",
+    "    }",
+    "",
+    "    /** Must be longer than the timeout of long polling getUpdates calls. */",
+    "    public ClientOptions setSocketTimeoutMillis(int socketTimeoutMillis) {",
+    "      this.socketTimeoutMillis = socketTimeoutMillis;",
+    "      return this;",
+    "    }",
+    "",
+    "    public ClientOptions setKeepAliveMillis(long keepAliveMillis) {",
+    "      this.keepAliveMillis = keepAliveMillis;",
+    "      return this;",
+    "    }",
+    "",
+    "    /** Executor of the asynchronous methods and of the non-blocking HTTP client. */",
+    "    public ClientOptions setExecutor(Executor executor) {",
+    "      this.executor = executor;",
+    "      return this;",
+    "    }",
+    "",
+    "    private CloseableHttpClient createClient() {",
+    "      var connectionManager = new PoolingHttpClientConnectionManager();",
+    "      connectionManager.setMaxTotal(maxConnections);",
+    "      connectionManager.setDefaultMaxPerRoute(maxConnections);",
+    "",
+    "      var requestConfig =",
+    "          RequestConfig.custom()",
+    "              .setConnectTimeout(connectTimeoutMillis)",
+    "              .setConnectionRequestTimeout(connectionRequestTimeoutMillis)",
+    "              .setSocketTimeout(socketTimeoutMillis)",
+    "              .build();",
+    "",
+    "      return HttpClients.custom()",
+    "          .setConnectionManager(connectionManager)",
+    "          .setDefaultRequestConfig(requestConfig)",
+    "          .setKeepAliveStrategy((response, context) -> keepAliveMillis)",
+    "          .evictIdleConnections(keepAliveMillis, TimeUnit.MILLISECONDS)",
+    "          .build();",
+    "    }",
+    "",
+    "    private HttpClient createAsyncClient() {",
+    "      return HttpClient.newBuilder()",
+    "          .executor(executor)",
+    "          .connectTimeout(Duration.ofMillis(connectTimeoutMillis))",
+    "          .build();",
+    "    }",
+    "  }",
+    "",
+    "  @Override",
+    "  public void close() {",
+    "    try {",
+    "      client.close();",
+    "    } catch (IOException e) {",
+    "      throw new RuntimeException(e);",
+    "    }",
     "  }",
 ]
 
 DEFAULT_LINES_AT_END = [
-    "  private Response makeRequest(String methodName, StringEntity paramsAsEntity) {",
+    "  private <T> T makeRequest(",
+    "      String methodName, StringEntity paramsAsEntity, java.lang.reflect.Type resultType) {",
     "    HttpPost request = new HttpPost(getUri(methodName));",
     "    request.setEntity(paramsAsEntity);",
     "    request.setHeader(\"Accept\", \"application/json\");",
     "    request.setHeader(\"Content-Type\", \"application/json\");",
-    "",
-    "    try (CloseableHttpClient client = HttpClients.createDefault()) {",
-    "      HttpResponse httpResponse = client.execute(request);",
-    "      return gson.fromJson(",
-    "          new String(httpResponse.getEntity().getContent().readAllBytes()), Response.class);",
-    "    } catch (IOException e) {",
-    "      throw new RuntimeException(e);",
-    "    }",
+    "    return execute(request, resultType);",
     "  }",
     "",
-    "  private Response makeMultipartFormRequest(String methodName, HttpEntity paramsAsEntity) {",
+    "  private <T> T makeMultipartFormRequest(",
+    "      String methodName, HttpEntity paramsAsEntity, java.lang.reflect.Type resultType) {",
     "    HttpPost request = new HttpPost(getUri(methodName));",
     "    request.setEntity(paramsAsEntity);",
+    "    return execute(request, resultType);",
+    "  }",
     "",
-    "    try (CloseableHttpClient client = HttpClients.createDefault()) {",
-    "      HttpResponse httpResponse = client.execute(request);",
-    "      return gson.fromJson(",
-    "          new String(httpResponse.getEntity().getContent().readAllBytes()), Response.class);",
+    "  private <T> T execute(HttpPost request, java.lang.reflect.Type resultType) {",
+    "    // Closing the content stream consumes the rest of it, which returns the connection to the pool.",
+    "    try (CloseableHttpResponse httpResponse = client.execute(request)) {",
+    "      return readResponse(httpResponse.getEntity().getContent(), resultType);",
     "    } catch (IOException e) {",
     "      throw new RuntimeException(e);",
     "    }",
     "  }",
     "",
-    "  private HttpEntity buildMultipartEntity(Object params) {",
-    "    final var type = params.getClass();",
-    "    final var fields = type.getDeclaredFields();",
-    "    final var form = MultipartEntityBuilder.create();",
+    "  private <T> CompletableFuture<T> makeRequestAsync(",
+    "      String methodName, StringEntity paramsAsEntity, java.lang.reflect.Type resultType) {",
+    "    var body = new ByteArrayOutputStream();",
+    "    try {",
+    "      paramsAsEntity.writeTo(body);",
+    "    } catch (IOException e) {",
+    "      return CompletableFuture.failedFuture(e);",
+    "    }",
     "",
-    "    for (final var field : fields) {",
-    "      var name = field.getName();",
-    "      if (field.isAnnotationPresent(SerializedName.class)) {",
-    "        var annotation = field.getAnnotation(SerializedName.class);",
-    "        name = annotation.value();",
-    "      }",
+    "    return executeAsync(",
+    "        methodName,",
+    "        \"application/json\",",
+    "        HttpRequest.BodyPublishers.ofByteArray(body.toByteArray()),",
+    "        resultType);",
+    "  }",
     "",
-    "      Object data = null;",
-    "      try {",
-    "        data = field.get(params);",
-    "      } catch (IllegalAccessException e) {",
-    "        throw new RuntimeException(\"Fields in Parameters type must be public!\");",
-    "      }",
+    "  private <T> CompletableFuture<T> makeMultipartFormRequestAsync(",
+    "      String methodName, HttpEntity paramsAsEntity, java.lang.reflect.Type resultType) {",
+    "    var body = HttpRequest.BodyPublishers.ofInputStream(() -> streamContent(paramsAsEntity));",
+    "    var length = paramsAsEntity.getContentLength();",
+    "    return executeAsync(",
+    "        methodName,",
+    "        paramsAsEntity.getContentType().getValue(),",
+    "        length < 0 ? body : HttpRequest.BodyPublishers.fromPublisher(body, length),",
+    "        resultType);",
+    "  }",
     "",
-    "      if (data instanceof InputFile inputFile) {",
-    "        switch (inputFile.type()) {",
-    "          case FILE_ID -> form.addTextBody(name, inputFile.fileId());",
-    "          case BYTES -> form.addBinaryBody(name, inputFile.bytes());",
-    "          case FILE -> form.addBinaryBody(name, inputFile.file());",
-    "        }",
-    "      } else {",
-    "        form.addTextBody(name, gson.toJson(data), ContentType.APPLICATION_JSON);",
-    "      }",
+    "  // Uploads are written into a pipe by their own thread while the HTTP client reads the other end,",
+    "  // so files are never buffered in memory. A dedicated thread is used because the writer blocks",
+    "  // whenever the pipe is full, which must not starve the executor the client reads on.",
+    "  private static InputStream streamContent(HttpEntity entity) {",
+    "    var input = new PipedInputStream(UPLOAD_PIPE_SIZE);",
+    "    PipedOutputStream output;",
+    "    try {",
+    "      output = new PipedOutputStream(input);",
+    "    } catch (IOException e) {",
+    "      throw new UncheckedIOException(e);",
     "    }",
     "",
-    "    return form.build();",
+    "    var writer =",
+    "        new Thread(",
+    "            () -> {",
+    "              try {",
+    "                entity.writeTo(output);",
+    "                output.close();",
+    "              } catch (IOException | RuntimeException e) {",
+    "                // Closing the read end fails the request instead of sending a truncated body.",
+    "                try {",
+    "                  input.close();",
+    "                } catch (IOException ignored) {",
+    "                }",
+    "              }",
+    "            },",
+    "            \"BotApi upload\");",
+    "    writer.setDaemon(true);",
+    "    writer.start();",
+    "    return input;",
     "  }",
     "",
-    "  private HttpEntity buildExtendedMultipartEntity(Object params) {",
-    "    final var type = params.getClass();",
-    "    final var fields = type.getDeclaredFields();",
-    "    final var form = MultipartEntityBuilder.create();",
-    "    final var inputFiles = new LinkedList<InputFile>();",
-    "",
-    "    for (final var field : fields) {",
-    "      var name = field.getName();",
-    "      if (field.isAnnotationPresent(SerializedName.class)) {",
-    "        var annotation = field.getAnnotation(SerializedName.class);",
-    "        name = annotation.value();",
-    "      }",
+    "  private <T> CompletableFuture<T> executeAsync(",
+    "      String methodName,",
+    "      String contentType,",
+    "      HttpRequest.BodyPublisher body,",
+    "      java.lang.reflect.Type resultType) {",
+    "    var request =",
+    "        HttpRequest.newBuilder(getUri(methodName))",
+    "            .timeout(requestTimeout)",
+    "            .header(\"Accept\", \"application/json\")",
+    "            .header(\"Content-Type\", contentType)",
+    "            .POST(body)",
+    "            .build();",
     "",
-    "      Object data = null;",
-    "      try {",
-    "        data = field.get(params);",
-    "      } catch (IllegalAccessException e) {",
-    "        throw new RuntimeException(\"Fields in Parameters type must be public!\");",
-    "      }",
+    "    return asyncClient",
+    "        .sendAsync(request, HttpResponse.BodyHandlers.ofInputStream())",
+    "        .thenApplyAsync(httpResponse -> readResponse(httpResponse.body(), resultType), executor);",
+    "  }",
     "",
-    "      // This code is valid, even when type contains InputFile type, because serializer puts file",
-    "      // attachment name or file_id and I can get it, when needs.",
-    "      form.addTextBody(name, gson.toJson(data), ContentType.APPLICATION_JSON);",
-    "      getAllInputFiles(field, params, inputFiles);",
-    "    }",
+    "  // Reads the response in one pass: the result is decoded straight from the stream into its type,",
+    "  // and \"ok\", \"error_code\" and \"description\" are checked along the way.",
+    "  private static <T> T readResponse(InputStream body, java.lang.reflect.Type resultType) {",
+    "    try (var reader = new JsonReader(new InputStreamReader(body, StandardCharsets.UTF_8))) {",
+    "      var ok = false;",
+    "      var resultFound = false;",
+    "      T result = null;",
+    "      String description = null;",
+    "      Integer errorCode = null;",
     "",
-    "    for (var inputFile : inputFiles) {",
-    "      switch (inputFile.type()) {",
-    "        case FILE_ID -> {",
-    "          /* Do nothing */",
+    "      reader.beginObject();",
+    "      while (reader.hasNext()) {",
+    "        switch (reader.nextName()) {",
+    "          case \"ok\" -> ok = reader.nextBoolean();",
+    "          case \"result\" -> {",
+    "            result = gson.fromJson(reader, resultType);",
+    "            resultFound = true;",
+    "          }",
+    "          case \"description\" -> description = reader.nextString();",
+    "          case \"error_code\" -> errorCode = reader.nextInt();",
+    "          default -> reader.skipValue();",
     "        }",
-    "        case BYTES -> form.addBinaryBody(inputFile.attachmentName(), inputFile.bytes());",
-    "        case FILE -> form.addBinaryBody(inputFile.attachmentName(), inputFile.file());",
     "      }",
+    "      reader.endObject();",
+    "",
+    "      if (!ok) {",
+    "        throw new RuntimeException(description != null ? description : String.valueOf(errorCode));",
+    "      }",
+    "      if (!resultFound) {",
+    "        throw new RuntimeException(\"Invalid result of response.\");",
+    "      }",
+    "      return result;",
+    "    } catch (IOException e) {",
+    "      throw new RuntimeException(e);",
     "    }",
+    "  }",
     "",
-    "    return form.build();",
+    "  private static void addJsonPart(MultipartEntityBuilder form, String name, Object data) {",
+    "    form.addTextBody(name, gson.toJson(data), ContentType.APPLICATION_JSON);",
     "  }",
     "",
-    "  private void getAllInputFiles(Field field, Object object, List<InputFile> inputFiles) {",
-    "    final var type = field.getType();",
-    "    if (DEFAULT_TYPES.contains(type) || SPECIFIC_TYPES.contains(type)) {",
+    "  private static void addInputFilePart(MultipartEntityBuilder form, String name, InputFile inputFile) {",
+    "    if (inputFile == null) {",
+    "      addJsonPart(form, name, null);",
     "      return;",
     "    }",
-    "    Consumer<Object> findRecursive =",
-    "        (otherObject) -> {",
-    "          for (var otherField : otherObject.getClass().getDeclaredFields()) {",
-    "            getAllInputFiles(otherField, otherObject, inputFiles);",
-    "          }",
-    "        };",
     "",
-    "    Object data = null;",
-    "    try {",
-    "      data = field.get(object);",
-    "    } catch (IllegalAccessException e) {",
-    "      throw new RuntimeException(\"Fields in Parameters type must be public!\");",
-    "    }",
-    "    if (data == null) {",
-    "      return;",
+    "    switch (inputFile.type()) {",
+    "      case FILE_ID -> form.addTextBody(name, inputFile.fileId());",
+    "      case BYTES -> form.addBinaryBody(name, inputFile.bytes());",
+    "      case FILE -> form.addBinaryBody(name, inputFile.file());",
     "    }",
+    "  }",
     "",
-    "    if (data instanceof List list) {",
-    "      for (var otherObject : list) {",
-    "        findRecursive.accept(otherObject);",
+    "  private static void addAttachedFileParts(MultipartEntityBuilder form, List<InputFile> inputFiles) {",
+    "    // Serializer already put the attachment names into the JSON parts.",
+    "    for (var inputFile : inputFiles) {",
+    "      switch (inputFile.type()) {",
+    "        case FILE_ID -> {",
+    "          /* Do nothing */",
+    "        }",
+    "        case BYTES -> form.addBinaryBody(inputFile.attachmentName(), inputFile.bytes());",
+    "        case FILE -> form.addBinaryBody(inputFile.attachmentName(), inputFile.file());",
     "      }",
-    "      return;",
-    "    }",
-    "",
-    "    if (data instanceof InputFile inputFile) {",
-    "      inputFiles.add(inputFile);",
-    "      return;",
     "    }",
-    "",
-    "    findRecursive.accept(data);",
-    "  }",
-    "",
-    "  private void raiseRuntimeException(Response response) {",
-    "    throw new RuntimeException(",
-    "        response.getDescription().isPresent()",
-    "            ? response.getDescription().orElseThrow()",
-    "            : String.valueOf(response.getErrorCode().orElseThrow()));",
     "  }",
     "",
     "  private URI getUri(String methodName) {",
-    "    return URI.create(String.format(urlTemplate, botToken, methodName));",
+    "    return uris.get(methodName);",
     "  }",
 ]
 
@@ -290,6 +422,203 @@ class FindState(Enum):
     DeepFound = 2
 
 
+class InputFileAnalysis:
+    reachable: set[str]
+    states: dict[str, FindState]
+
+    def __init__(self, types: TypeRegistry) -> None:
+        self.reachable = set()
+        self.states = {}
+        self.__analyze(types)
+
+    def __find_reachable(self, types: TypeRegistry) -> None:
+        referrers: dict[str, list[str]] = {}
+        pending: list[str] = []
+
+        for type_ in types.by_name.values():
+            if type_.is_supertype:
+                for subtype in cast(list[str], type_.subtypes):
+                    referrers.setdefault(subtype, []).append(type_.name)
+
+            for field in type_.fields:
+                unwrapped_type = unwrap_type(field.type_)
+                if unwrapped_type == "InputFile":
+                    pending.append(type_.name)
+                else:
+                    referrers.setdefault(unwrapped_type, []).append(type_.name)
+
+        while pending:
+            name = pending.pop()
+            if name in self.reachable:
+                continue
+
+            self.reachable.add(name)
+            pending.extend(referrers.get(name, []))
+
+    def __find_state(self, type_: Type) -> FindState:
+        if type_.is_supertype:
+            for subtype in cast(list[str], type_.subtypes):
+                if subtype in self.reachable:
+                    return FindState.DeepFound
+
+        for field in type_.fields:
+            unwrapped_type = unwrap_type(field.type_)
+
+            if unwrapped_type == "InputFile":
+                return FindState.Found
+            if unwrapped_type in self.reachable:
+                return FindState.DeepFound
+
+        return FindState.NotFound
+
+    def __analyze(self, types: TypeRegistry) -> None:
+        self.__find_reachable(types)
+
+        for type_ in types.by_name.values():
+            self.states[type_.name] = self.__find_state(type_)
+
+    def state_of(self, name: str) -> FindState:
+        return self.states[name]
+
+    def reaches_input_file(self, name: str) -> bool:
+        return name in self.reachable
+
+
+# Multipart forms are written field by field from the parsed types, so sending
+# files doesn't need reflection on the parameters.
+class MultipartEncoders:
+    types: TypeRegistry
+    input_files: InputFileAnalysis
+    mode: OutputMode
+    collectors: list[str]
+    imports: set[str]
+
+    def __init__(self, types: TypeRegistry, input_files: InputFileAnalysis, mode: OutputMode) -> None:
+        self.types = types
+        self.input_files = input_files
+        self.mode = mode
+        self.collectors = []
+        self.imports = set()
+
+    @staticmethod
+    def encoder_name(parameter_name: str) -> str:
+        return f"encode{parameter_name}"
+
+    @staticmethod
+    def __collector_name(type_name: str) -> str:
+        return f"collect{type_name}InputFiles"
+
+    def __access(self, variable: str, field: Field) -> str:
+        if self.mode == OutputMode.Records:
+            return f"{variable}.{field.camel_cased_name}()"
+        return f"{variable}.{field.camel_cased_name}"
+
+    def __require_collector(self, type_name: str) -> str:
+        if type_name not in self.collectors:
+            self.collectors.append(type_name)
+            type_ = self.types[type_name]
+            self.imports.add(f"import {{base_packagename}}.{type_.type_classification.package()}.{type_name};")
+        return self.__collector_name(type_name)
+
+    def __collect(self, out: CodeEmitter, expression: str, java_type: str, indent: str, depth: int = 0) -> None:
+        if java_type.startswith("List<"):
+            item = f"item{depth}"
+            out.write(
+                f"{indent}if ({expression} != null) {{\n"
+                f"{indent}  for (var {item} : {expression}) {{\n"
+            )
+            self.__collect(out, item, java_type[len("List<"):-1], indent + "    ", depth + 1)
+            out.write(
+                f"{indent}  }}\n"
+                f"{indent}}}\n"
+            )
+        elif java_type == "InputFile":
+            out.write(
+                f"{indent}if ({expression} != null) {{\n"
+                f"{indent}  inputFiles.add({expression});\n"
+                f"{indent}}}\n"
+            )
+        else:
+            out.write(f"{indent}{self.__require_collector(java_type)}({expression}, inputFiles);\n")
+
+    def __carries_input_file(self, field: Field) -> bool:
+        unwrapped_type = unwrap_type(field.type_)
+        return unwrapped_type == "InputFile" or self.input_files.reaches_input_file(unwrapped_type)
+
+    def __encoder(self, out: CodeEmitter, type_: Type, extended: bool) -> None:
+        out.write(
+            f"  private static HttpEntity {self.encoder_name(type_.name)}({type_.name} params) {{\n"
+            "    final var form = MultipartEntityBuilder.create();\n"
+        )
+        if extended:
+            out.write("    final var inputFiles = new ArrayList<InputFile>();\n")
+        out.write("\n")
+
+        for field in type_.fields:
+            part = "addInputFilePart" if field.type_ == "InputFile" and not extended else "addJsonPart"
+            out.write(f"    {part}(form, \"{field.name}\", {self.__access('params', field)});\n")
+
+        if extended:
+            out.write(
+                "\n"
+                f"    {self.__require_collector(type_.name)}(params, inputFiles);\n"
+                "    addAttachedFileParts(form, inputFiles);\n"
+            )
+        out.write(
+            "\n"
+            "    return form.build();\n"
+            "  }\n"
+        )
+
+    def __collector(self, out: CodeEmitter, type_: Type) -> None:
+        out.write(
+            f"  private static void {self.__collector_name(type_.name)}({type_.name} value, List<InputFile> inputFiles) {{\n"
+        )
+
+        if type_.is_supertype:
+            subtypes = list(filter(self.input_files.reaches_input_file, cast(list[str], type_.subtypes)))
+            for index, subtype in enumerate(subtypes):
+                keyword = "if" if index == 0 else "} else if"
+                out.write(
+                    f"    {keyword} (value instanceof {subtype} subtype) {{\n"
+                    f"      {self.__require_collector(subtype)}(subtype, inputFiles);\n"
+                )
+            if subtypes:
+                out.write("    }\n")
+        else:
+            out.write(
+                "    if (value == null) {\n"
+                "      return;\n"
+                "    }\n"
+            )
+            fields = list(filter(self.__carries_input_file, type_.fields))
+            if fields:
+                out.write("\n")
+            for field in fields:
+                self.__collect(out, self.__access("value", field), field.type_, "    ")
+
+        out.write("  }\n")
+
+    def render(self, out: CodeEmitter, methods: list["Method"]) -> None:
+        for method in methods:
+            if not method.arguments_exists:
+                continue
+
+            state = self.input_files.state_of(method.parameter_name)
+            if state == FindState.NotFound:
+                continue
+
+            self.__encoder(out, self.types[method.parameter_name], state == FindState.DeepFound)
+            out.write("\n")
+
+        # Collectors may ask for more collectors while they are rendered.
+        index = 0
+        while index < len(self.collectors):
+            self.__collector(out, self.types[self.collectors[index]])
+            out.write("\n")
+            index += 1
+
+
 class Method:
     name: str
     parameter_name: str
@@ -298,11 +627,13 @@ class Method:
     return_type: str
     imports: set[str]
     arguments_exists: bool
+    spec_hash: str
 
-    def __init__(self, raw_method: dict) -> None:
+    def __init__(self, raw_method: Mapping) -> None:
         self.__parse(raw_method)
 
-    def __parse(self, raw_method: dict) -> None:
+    def __parse(self, raw_method: Mapping) -> None:
+        self.spec_hash = hash_spec(raw_method)
         self.name = raw_method["name"]
         self.parameter_name = to_pascal_case(self.name) + "Parameters"
         self.href = raw_method["href"]
@@ -312,184 +643,232 @@ class Method:
             raw_method["returns"], required=False)
         self.arguments_exists = "fields" in raw_method
 
-    def __find_input_file_field(self, type_: Type, types: list[Type], _level: int = 1) -> FindState:
-        if type_.is_supertype:
-            for subtype in cast(list[str], type_.subtypes):
-                subtype = next(
-                    filter(lambda maybe_subtype: maybe_subtype.name == subtype, types))
-
-                result = self.__find_input_file_field(
-                    subtype, types, _level + 1)
-                if result != FindState.NotFound:
-                    return result
-
-        for field in type_.fields:
-            unwrapped_type = unwrap_type(field.type_)
-
-            if unwrapped_type == "InputFile":
-                return FindState(min(_level, 2))
-
-            inner_type = next(
-                filter(lambda inner_type: inner_type.name == unwrapped_type, types), None)
-
-            if inner_type is None:
-                continue
-
-            result = self.__find_input_file_field(
-                inner_type, types, _level + 1)
-            if result != FindState.NotFound:
-                return result
-
-        return FindState.NotFound
+    def __entity_and_request(self, input_files: InputFileAnalysis) -> tuple[str, str]:
+        if not self.arguments_exists:
+            return ("new StringEntity(\"\", Charset.forName(\"UTF-8\"))", "makeRequest")
 
-    def __build_entity_and_request_lines(self, indent: str, state: FindState) -> list[str]:
-        match state:
+        match input_files.state_of(self.parameter_name):
             case FindState.NotFound:
-                return [
-                    f"{indent}final var entity = new StringEntity(gson.toJson(params), Charset.forName(\"UTF-8\"));\n"
-                    f"{indent}var response = makeRequest(methodName, entity);\n"
-                ]
-            case FindState.Found:
-                return [
-                    f"{indent}final var entity = buildMultipartEntity(params);\n"
-                    f"{indent}var response = makeMultipartFormRequest(methodName, entity);\n"
-                ]
-            case FindState.DeepFound:
-                return [
-                    f"{indent}final var entity = buildExtendedMultipartEntity(params);\n"
-                    f"{indent}var response = makeMultipartFormRequest(methodName, entity);\n"
-                ]
+                return ("new StringEntity(gson.toJson(params), Charset.forName(\"UTF-8\"))", "makeRequest")
+            case FindState.Found | FindState.DeepFound:
+                return (f"{MultipartEncoders.encoder_name(self.parameter_name)}(params)", "makeMultipartFormRequest")
             case _:
                 raise Exception(
                     "The enum FindState match is not exhaustive!")
 
-    def __generate_docs(self, indent_spaces: int) -> str:
+    def __generate_docs(self, indent_spaces: int, phrases: list[str] | None = None) -> str:
         def wrap_link(link: str) -> str:
             return f"<a href={link}>Source</a>"
 
-        return generate_description([*self.description, wrap_link(self.href)], indent_spaces)
+        phrases = phrases or []
+        return generate_description([*self.description, *phrases, wrap_link(self.href)], indent_spaces)
+
+    def __signature(self, return_type: str, name: str) -> str:
+        if self.arguments_exists:
+            return f"public {return_type} {name}({self.parameter_name} params)"
+        return f"public {return_type} {name}()"
+
+    def result_type_constant(self) -> str:
+        return f"{to_constant_case(self.name)}_RESULT_TYPE"
 
-    def create_body(self, types: list[Type], indent_spaces: int) -> list[str]:
+    def create_body(self, out: CodeEmitter, input_files: InputFileAnalysis, indent_spaces: int) -> None:
         indent = " " * indent_spaces
 
-        lines: list[str] = [self.__generate_docs(indent_spaces)]
+        out.write(
+            f"{indent}private static final java.lang.reflect.Type {self.result_type_constant()} =\n"
+            f"{indent * 3}new TypeToken<{self.return_type}>() {{}}.getType();\n"
+            "\n"
+        )
+        out.write(self.__generate_docs(indent_spaces))
+        out.write(f"{indent}{self.__signature(self.return_type, self.name)} {{\n")
         if self.arguments_exists:
-            lines.extend([
-                f"{indent}public {self.return_type} {self.name}({self.parameter_name} params) {{\n",
-                f"{indent * 2}TypeVerifier.verify(params);\n",
-                EMPTY_LINE
-            ])
-        else:
-            lines.append(
-                f"{indent}public {self.return_type} {self.name}() {{\n",
+            out.write(
+                f"{indent * 2}{self.parameter_name}.validate(params);\n"
+                "\n"
             )
 
-        lines.extend([
-            f"{indent * 2}final var methodName = \"{self.name}\";\n",
-            EMPTY_LINE
-        ])
+        out.write(
+            f"{indent * 2}final var methodName = \"{self.name}\";\n"
+            "\n"
+        )
+
+        entity, request = self.__entity_and_request(input_files)
+        out.write(
+            f"{indent * 2}final var entity = {entity};\n"
+            f"{indent * 2}return {request}(methodName, entity, {self.result_type_constant()});\n"
+            f"{indent}}}\n"
+        )
 
+    def create_async_body(self, out: CodeEmitter, input_files: InputFileAnalysis, indent_spaces: int) -> None:
+        indent = " " * indent_spaces
+        return_type = self.return_type
+        future_type = f"CompletableFuture<{return_type}>"
+
+        out.write(self.__generate_docs(indent_spaces, [f"Asynchronous version of {{@link #{self.name}}}."]))
+        out.write(
+            f"{indent}{self.__signature(future_type, self.name + 'Async')} {{\n"
+            f"{indent * 2}final var methodName = \"{self.name}\";\n"
+            "\n"
+            f"{indent * 2}return CompletableFuture.supplyAsync(\n"
+            f"{indent * 6}() -> {{\n"
+        )
         if self.arguments_exists:
-            type_ = next(filter(lambda type_: type_.name ==
-                         self.parameter_name, types))
-            state = self.__find_input_file_field(type_, types)
-            lines.extend(
-                self.__build_entity_and_request_lines(indent * 2, state))
-        else:
-            lines.extend([
-                f"{indent * 2}final var entity = new StringEntity(\"\", Charset.forName(\"UTF-8\"));\n",
-                f"{indent * 2}var response = makeRequest(methodName, entity);\n"
-            ])
-
-        lines.extend([
-            EMPTY_LINE,
-            f"{indent * 2}if (!response.isOk()) {{\n",
-            f"{indent * 3}raiseRuntimeException(response);\n",
-            f"{indent * 2}}}\n",
-            EMPTY_LINE,
-            f"{indent * 2}var type = new TypeToken<{self.return_type}>() {{}}.getType();\n",
-            f"{indent * 2}var jsonElement =\n",
-            f"{indent * 4}response.getResult().orElseThrow(() -> new RuntimeException(\"Invalid result of response.\"));\n",
-            EMPTY_LINE,
-            f"{indent * 2}return gson.fromJson(jsonElement, type);\n",
-            f"{indent}}}\n",
-        ])
-
-        return lines
+            out.write(f"{indent * 7}{self.parameter_name}.validate(params);\n")
+
+        entity, request = self.__entity_and_request(input_files)
+        out.write(
+            f"{indent * 7}return {entity};\n"
+            f"{indent * 6}}},\n"
+            f"{indent * 6}executor)\n"
+            f"{indent * 4}.thenCompose(\n"
+            f"{indent * 6}entity ->\n"
+            f"{indent * 8}this.<{return_type}>{request}Async(\n"
+            f"{indent * 10}methodName, entity, {self.result_type_constant()}));\n"
+            f"{indent}}}\n"
+        )
 
 
 class MethodGenerator:
-    types: list[Type]
+    types: TypeRegistry
+    input_files: InputFileAnalysis
     methods: list[Method]
+    profiler: Profiler
+    partial: bool
 
-    def __init__(self) -> None:
+    def __init__(self, profiler: Profiler = DISABLED_PROFILER) -> None:
         self.methods = []
+        self.profiler = profiler
+        self.partial = False
 
-    def set_types(self, types: list[Type]) -> None:
+    def set_types(self, types: TypeRegistry) -> None:
         self.types = types
-
-    def add_method(self, raw_method: dict) -> None:
-        self.methods.append(Method(raw_method))
-
-    def build_java_class(self, base_packagename: str) -> list[str]:
-
-        def append_new_lines(data: Iterable[str]) -> list[str]:
-            return list(map(lambda line: line + "\n", data))
-
-        def get_import_params(base_packagename: str, types: list[Type]) -> list[str]:
-            parameters = filter(lambda type_: type_.type_classification ==
-                                TypeClassification.MethodParameters, types)
+        self.input_files = InputFileAnalysis(types)
+
+    def retain(self, methods: list[Method]) -> None:
+        self.methods = methods
+        self.partial = True
+
+    def __adapter_needed(self, type_name: str) -> bool:
+        if not self.partial:
+            return True
+        if type_name in DEFAULT_DYNAMIC_IMPORTS:
+            return all(map(lambda dependency: dependency in self.types, HANDWRITTEN_DEPENDENCIES.get(type_name, [])))
+        return type_name in self.types
+
+    def add_method(self, raw_method: Mapping) -> Method:
+        method = Method(raw_method)
+        self.methods.append(method)
+        return method
+
+    def add_parsed_method(self, method: Method) -> None:
+        self.methods.append(method)
+
+    def spec_hash(self) -> str:
+        return hash_content("".join(map(lambda method: method.spec_hash, self.methods)))
+
+    def __write_adapter_factory(self, out: CodeEmitter, base_packagename: str) -> None:
+        out.write(
+            "  // Generated types are read and written by their own GsonAdapter instead of reflection.\n"
+            "  private static final class GeneratedTypeAdapterFactory implements TypeAdapterFactory {\n"
+            "\n"
+            "    private static final Map<Class<?>, Function<Gson, TypeAdapter<?>>> ADAPTERS = new HashMap<>();\n"
+            "\n"
+            "    static {\n"
+        )
+        for type_ in self.types.by_name.values():
+            if type_.is_supertype:
+                continue
+            classname = f"{base_packagename}.{type_.type_classification.package()}.{type_.name}"
+            out.write(f"      ADAPTERS.put({classname}.class, {classname}.GsonAdapter::new);\n")
+        out.write(
+            "    }\n"
+            "\n"
+            "    @Override\n"
+            "    @SuppressWarnings(\"unchecked\")\n"
+            "    public <T> TypeAdapter<T> create(Gson gson, com.google.gson.reflect.TypeToken<T> type) {\n"
+            "      var adapter = ADAPTERS.get(type.getRawType());\n"
+            "      return adapter != null ? (TypeAdapter<T>) adapter.apply(gson) : null;\n"
+            "    }\n"
+            "  }\n"
+        )
+
+    def build_java_class(self, base_packagename: str, mode: OutputMode = OutputMode.Classes,
+                         profile: bool = True) -> str:
+
+        def get_import_params(base_packagename: str, types: TypeRegistry) -> list[str]:
+            parameters = types.in_package(TypeClassification.MethodParameters)
             return list(map(
-                lambda param: f"import {base_packagename}.{param.type_classification.package()}.{param.name};\n", parameters))
+                lambda param: f"import {base_packagename}.{param.type_classification.package()}.{param.name};", parameters))
 
-        def get_import_types(base_packagename: str, methods: list[Method], types: list[Type]):
+        def get_import_types(base_packagename: str, methods: list[Method], types: TypeRegistry) -> set[str]:
             imports = set()
             for method in methods:
                 return_type = unwrap_type(method.return_type)
-                type_to_import = next(
-                    filter(lambda type_: type_.name == return_type, types), None)
+                type_to_import = types.get(return_type)
 
                 if type_to_import is None:
                     continue
 
                 imports.add(
-                    f"import {base_packagename}.{type_to_import.type_classification.package()}.{type_to_import.name};\n")
+                    f"import {base_packagename}.{type_to_import.type_classification.package()}.{type_to_import.name};")
 
             return imports
 
-        lines: list[str] = [
-            f"package {base_packagename}.{PACKAGE};\n",
-            EMPTY_LINE
-        ]
-
-        lines.extend(append_new_lines(IMPORTS))
-
-        import_set = map(lambda method: method.imports, self.methods)
-        specific_imports = reduce(
-            lambda i1, i2: i1.union(i2), import_set, set())
-        lines.extend(append_new_lines(specific_imports))
+        encoders = MultipartEncoders(self.types, self.input_files, mode)
+        encoders_out = CodeEmitter()
+        encoders.render(encoders_out, self.methods)
 
-        lines.extend(get_import_params(base_packagename, self.types))
-        lines.extend(get_import_types(
-            base_packagename, self.methods, self.types))
+        out = CodeEmitter()
+        out.write(f"package {base_packagename}.{PACKAGE};\n\n")
 
-        lines.append(EMPTY_LINE)
-        lines.extend(append_new_lines(CLASS_DOCUMENTATION))
-
-        lines.extend([
-            EMPTY_LINE,
-            f"public final class {CLASSNAME} {{\n",
-            EMPTY_LINE
-        ])
-
-        lines.extend(append_new_lines(DEFAULT_LINES_AT_START))
-        lines.append(EMPTY_LINE)
+        out.lines(render_imports(IMPORTS, base_packagename))
 
+        specific_imports = set()
         for method in self.methods:
-            lines.extend(method.create_body(self.types,  indent_spaces=2))
-            lines.append(EMPTY_LINE)
+            specific_imports.update(method.imports)
+        specific_imports.difference_update(IMPORTS)
+        out.lines(render_imports(specific_imports, base_packagename))
+
+        out.lines(get_import_params(base_packagename, self.types))
+        import_types = get_import_types(base_packagename, self.methods, self.types)
+        import_types.update(render_imports(encoders.imports, base_packagename))
+        import_types.difference_update(get_import_params(base_packagename, self.types))
+        out.lines(sorted(import_types))
+
+        out.write("\n")
+        out.lines(CLASS_DOCUMENTATION)
+
+        out.write(f"\npublic final class {CLASSNAME} implements AutoCloseable {{\n\n")
+
+        out.lines(DEFAULT_LINES_AT_START)
+        for type_name, adapter in filter(lambda adapter: self.__adapter_needed(adapter[0]), TYPE_ADAPTERS):
+            out.write(
+                "        .registerTypeAdapter(\n"
+                f"            {base_packagename}.types.{type_name}.class,\n"
+                f"            new {base_packagename}.types.{adapter}())\n"
+            )
+        out.write("        .registerTypeAdapterFactory(new GeneratedTypeAdapterFactory())\n")
+        out.lines(DEFAULT_LINES_AFTER_ADAPTERS)
+        out.write("\n")
+        self.__write_adapter_factory(out, base_packagename)
+        out.write("\n")
 
-        lines.extend(append_new_lines(DEFAULT_LINES_AT_END))
-        lines.append("}\n")
+        out.write("  private static final String[] METHOD_NAMES = {\n")
+        for method in self.methods:
+            out.write(f"    \"{method.name}\",\n")
+        out.write("  };\n\n")
 
-        return lines
+        for method in self.methods:
+            start = perf_counter()
+            method.create_body(out, self.input_files, indent_spaces=2)
+            out.write("\n")
+            method.create_async_body(out, self.input_files, indent_spaces=2)
+            out.write("\n")
+            if profile:
+                self.profiler.record("methods", method.name, perf_counter() - start)
+
+        out.write(encoders_out.getvalue())
+        out.lines(DEFAULT_LINES_AT_END)
+        out.write("}\n")
+
+        return out.getvalue()
@@ -0,0 +1,77 @@
+from contextlib import contextmanager, nullcontext
+from time import perf_counter, process_time
+from typing import Iterator
+
+
+class PhaseTiming:
+    wall: float
+    cpu: float
+
+    def __init__(self) -> None:
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+class Profiler:
+    enabled: bool
+    phases: dict[str, PhaseTiming]
+    items: dict[str, list[tuple[str, float]]]
+    caches: dict[str, tuple[int, int]]
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.phases = {}
+        self.items = {}
+        self.caches = {}
+
+    @contextmanager
+    def __measure(self, name: str) -> Iterator[None]:
+        wall = perf_counter()
+        cpu = process_time()
+        try:
+            yield
+        finally:
+            timing = self.phases.setdefault(name, PhaseTiming())
+            timing.wall += perf_counter() - wall
+            timing.cpu += process_time() - cpu
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return nullcontext()
+        return self.__measure(name)
+
+    def record(self, kind: str, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.items.setdefault(kind, []).append((name, seconds))
+
+    def record_cache(self, name: str, hits: int, misses: int) -> None:
+        if self.enabled:
+            self.caches[name] = (hits, misses)
+
+    def slowest(self, kind: str, top: int) -> list[tuple[str, float]]:
+        items = self.items.get(kind, [])
+        return sorted(items, key=lambda item: item[1], reverse=True)[:top]
+
+    def report(self, top: int = 10) -> str:
+        lines = [f"{'Phase':<32}{'Wall (ms)':>12}{'CPU (ms)':>12}"]
+        for name, timing in self.phases.items():
+            lines.append(f"{name:<32}{timing.wall * 1000:>12.2f}{timing.cpu * 1000:>12.2f}")
+
+        for kind in self.items:
+            lines.append("")
+            lines.append(f"Slowest {kind} to render:")
+            for name, seconds in self.slowest(kind, top):
+                lines.append(f"  {name:<40}{seconds * 1000:>10.3f} ms")
+
+        if self.caches:
+            lines.append("")
+            lines.append("Cache hit rates:")
+            for name, (hits, misses) in self.caches.items():
+                lookups = hits + misses
+                rate = hits / lookups * 100 if lookups else 0.0
+                lines.append(f"  {name:<40}{hits:>8} hits {misses:>8} misses {rate:>7.1f} %")
+
+        return "\n".join(lines)
+
+
+DISABLED_PROFILER = Profiler(enabled=False)
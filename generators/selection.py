@@ -0,0 +1,58 @@
+from typing import Iterable, cast
+
+from generators.helpers import unwrap_type
+from generators.methodgen import Method
+from generators.typegen import HANDWRITTEN_DEPENDENCIES, Type, TypeRegistry
+
+
+class Selection:
+    roots: list[str]
+
+    def __init__(self, roots: Iterable[str]) -> None:
+        self.roots = list(roots)
+
+    @staticmethod
+    def __dependencies(type_: Type) -> list[str]:
+        dependencies = list(map(lambda field: unwrap_type(field.type_), type_.fields))
+        dependencies.extend(type_.subtype_of or [])
+        if type_.is_supertype:
+            dependencies.extend(cast(list[str], type_.subtypes))
+        return dependencies
+
+    def closure(self, types: TypeRegistry, methods: list[Method]) -> set[str]:
+        methods_by_name = {method.name: method for method in methods}
+
+        selected: set[str] = set()
+        pending: list[str] = []
+        for name in self.roots:
+            method = methods_by_name.get(name)
+            if method is not None:
+                selected.add(name)
+                if method.arguments_exists:
+                    pending.append(method.parameter_name)
+                pending.append(unwrap_type(method.return_type))
+            elif name in types:
+                pending.append(name)
+            else:
+                raise Exception(f"Unknown method or type: {name}!")
+
+        while pending:
+            name = pending.pop()
+            if name in selected:
+                continue
+
+            selected.add(name)
+            pending.extend(HANDWRITTEN_DEPENDENCIES.get(name, []))
+
+            # Every type registered under the name contributes its dependencies.
+            for type_ in types.all_named(name):
+                pending.extend(self.__dependencies(type_))
+
+        return selected
+
+    def apply(self, types: TypeRegistry, methods: list[Method]) -> tuple[TypeRegistry, list[Method]]:
+        selected = self.closure(types, methods)
+        return (
+            TypeRegistry(filter(lambda type_: type_.name in selected, types)),
+            list(filter(lambda method: method.name in selected, methods)),
+        )
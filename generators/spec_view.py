@@ -0,0 +1,55 @@
+from typing import Any, Iterator, Mapping
+
+
+# Read-only view over the loaded spec: derived entries only keep their overridden keys,
+# and nested values are frozen on access, so parsing can't mutate the spec.
+class SpecView(Mapping):
+    __slots__ = ("data", "overrides")
+
+    data: Mapping[str, Any]
+    overrides: dict[str, Any]
+
+    def __init__(self, data: Mapping[str, Any], overrides: dict[str, Any] | None = None) -> None:
+        self.data = data
+        self.overrides = overrides or {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.overrides:
+            return freeze(self.overrides[key])
+        return freeze(self.data[key])
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.overrides or key in self.data
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.overrides
+        for key in self.data:
+            if key not in self.overrides:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.data) + sum(1 for key in self.overrides if key not in self.data)
+
+    def __repr__(self) -> str:
+        return f"SpecView({dict(self)!r})"
+
+    def to_json(self) -> dict:
+        data = self.data.to_json() if isinstance(self.data, SpecView) else dict(self.data)
+        data.update((key, thaw(value)) for key, value in self.overrides.items())
+        return data
+
+
+def freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return SpecView(value)
+    if isinstance(value, list):
+        return tuple(map(freeze, value))
+    return value
+
+
+def thaw(value: Any) -> Any:
+    if isinstance(value, SpecView):
+        return value.to_json()
+    if isinstance(value, tuple):
+        return list(map(thaw, value))
+    return value
@@ -0,0 +1,165 @@
+from threading import Lock
+
+from generators.constants import ARRAY_OF
+from generators.imports import Imports
+
+ATTACH_FEATURE = "attach://"
+BIT_64_FEATURE = "64 bit"
+HYPHENATED_BIT_64_FEATURE = "64-bit"
+
+
+class TypeRule:
+    types: tuple[str, ...]
+    java_type: str
+    imports: frozenset[str]
+    required: bool | None
+
+    def __init__(self, types: list[str] | tuple[str, ...], java_type: str,
+                 imports: set[str] | frozenset[str] = frozenset(), required: bool | None = None) -> None:
+        self.types = tuple(types)
+        self.java_type = java_type
+        self.imports = frozenset(imports)
+        self.required = required
+
+    def matches(self, types: tuple[str, ...], required: bool) -> bool:
+        return self.types == types and (self.required is None or self.required == required)
+
+
+class DescriptionRule:
+    feature: str
+    original_type: str | None
+    java_type: str
+
+    def __init__(self, feature: str, original_type: str | None, java_type: str) -> None:
+        self.feature = feature
+        self.original_type = original_type
+        self.java_type = java_type
+
+    def apply(self, original_type: str, features: frozenset[str]) -> str:
+        if self.feature not in features:
+            return original_type
+        if self.original_type is not None and self.original_type != original_type:
+            return original_type
+        return self.java_type
+
+
+PRIMITIVE_TYPES = {
+    "True": "boolean",
+    "Float number": "float",
+    "Integer": "int",
+    "Boolean": "boolean",
+    "Float": "float",
+    "Long": "long",
+}
+
+BOXED_TYPES = {
+    "True": "Boolean",
+    "Float number": "Float",
+}
+
+UNION_RULES = [
+    TypeRule(["Integer", "String"], "Id"),
+    TypeRule(["InputFile", "String"], "InputFile"),
+    TypeRule(["Message", "Boolean"], "MessageOrBoolean", {Imports.MessageOrBoolean.as_line()}),
+]
+
+# Applied in order, so a "64 bit" description turns any single type into Long,
+# while "64-bit" only widens Integer.
+DESCRIPTION_RULES = [
+    DescriptionRule(ATTACH_FEATURE, "String", "InputFile"),
+    DescriptionRule(BIT_64_FEATURE, None, "Long"),
+    DescriptionRule(HYPHENATED_BIT_64_FEATURE, "Integer", "Long"),
+]
+
+
+class TypeMapper:
+    rules: list[TypeRule]
+    union_rules: list[TypeRule]
+    description_rules: list[DescriptionRule]
+    features: list[str]
+    primitive_types: dict[str, str]
+    boxed_types: dict[str, str]
+    cache: dict[tuple[tuple[str, ...], bool, frozenset[str]], tuple[str, frozenset[str]]]
+    hits: int
+    misses: int
+    lock: Lock
+
+    def __init__(self) -> None:
+        self.rules = []
+        self.union_rules = list(UNION_RULES)
+        self.description_rules = list(DESCRIPTION_RULES)
+        self.features = [ATTACH_FEATURE, BIT_64_FEATURE, HYPHENATED_BIT_64_FEATURE]
+        self.primitive_types = dict(PRIMITIVE_TYPES)
+        self.boxed_types = dict(BOXED_TYPES)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def register_rule(self, rule: TypeRule) -> None:
+        with self.lock:
+            self.rules.append(rule)
+            self.cache.clear()
+
+    def register_description_rule(self, rule: DescriptionRule) -> None:
+        with self.lock:
+            self.description_rules.append(rule)
+            if rule.feature not in self.features:
+                self.features.append(rule.feature)
+            self.cache.clear()
+
+    def map(self, original_types: list[str], required: bool, description: str = "") -> tuple[str, set[str]]:
+        types = tuple(original_types)
+        features = frozenset(feature for feature in self.features if feature in description) \
+            if len(types) == 1 else frozenset()
+
+        key = (types, required, features)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return (cached[0], set(cached[1]))
+
+        self.misses += 1
+        java_type, imports = self.__resolve(types, required, features)
+        self.cache[key] = (java_type, imports)
+        return (java_type, set(imports))
+
+    def __map_array_type(self, original_type: str) -> tuple[str, frozenset[str]]:
+        level = 0
+        while original_type.startswith(ARRAY_OF):
+            level += 1
+            original_type = original_type[len(ARRAY_OF):]
+
+        original_type = self.boxed_types.get(original_type, original_type)
+        for _ in range(level):
+            original_type = f"List<{original_type}>"
+
+        return (original_type, frozenset([Imports.List.as_line()]))
+
+    def __resolve(self, types: tuple[str, ...], required: bool,
+                  features: frozenset[str]) -> tuple[str, frozenset[str]]:
+        for rule in self.rules:
+            if rule.matches(types, required):
+                return (rule.java_type, rule.imports)
+
+        if len(types) != 1:
+            for rule in self.union_rules:
+                if rule.matches(types, required):
+                    return (rule.java_type, rule.imports)
+            raise Exception(f"Unknown type: {list(types)}!")
+
+        original_type = types[0]
+        for description_rule in self.description_rules:
+            original_type = description_rule.apply(original_type, features)
+
+        if required and original_type in self.primitive_types:
+            return (self.primitive_types[original_type], frozenset())
+        if not required and original_type in self.boxed_types:
+            return (self.boxed_types[original_type], frozenset())
+        if original_type.startswith(ARRAY_OF):
+            return self.__map_array_type(original_type)
+
+        return (original_type, frozenset())
+
+
+TYPE_MAPPER = TypeMapper()
@@ -1,11 +1,14 @@
-from functools import reduce
-from typing import cast
+from typing import Iterable, Iterator, Mapping, cast
 from copy import copy
 from enum import Enum
 import re
 
 from .helpers import *
-from generators.constants import EMPTY_LINE, ARRAY_OF
+from generators.constants import ARRAY_OF
+from generators.emitter import CodeEmitter
+from generators.imports import import_line, render_imports
+from generators.profiler import DISABLED_PROFILER, Profiler
+from generators.spec_view import SpecView
 
 
 class TypeClassification(Enum):
@@ -16,6 +19,52 @@ class TypeClassification(Enum):
         return self.value
 
 
+class OutputMode(Enum):
+    Classes = "classes"
+    Records = "records"
+
+
+RECORD_BUILDER_MIN_OPTIONAL_FIELDS = 4
+
+# Types read and written by JsonReader / JsonWriter directly, without a delegate adapter.
+JSON_READERS = {
+    "int": "in.nextInt()",
+    "Integer": "in.nextInt()",
+    "long": "in.nextLong()",
+    "Long": "in.nextLong()",
+    "float": "(float) in.nextDouble()",
+    "Float": "(float) in.nextDouble()",
+    "double": "in.nextDouble()",
+    "Double": "in.nextDouble()",
+    "boolean": "in.nextBoolean()",
+    "Boolean": "in.nextBoolean()",
+    "String": "in.nextString()",
+}
+
+BOXED_PRIMITIVES = {
+    "int": "Integer",
+    "long": "Long",
+    "float": "Float",
+    "double": "Double",
+    "boolean": "Boolean",
+    "char": "Character",
+    "byte": "Byte",
+    "short": "Short",
+}
+
+ADAPTER_IMPORTS = [
+    Imports.Gson,
+    Imports.TypeAdapter,
+    Imports.JsonReader,
+    Imports.JsonToken,
+    Imports.JsonWriter,
+    Imports.IOException,
+]
+
+CONSTANT_DATA_REGEXS = [re.compile("must be \\w*$"),
+                        re.compile("always \"\\w*\"$")]
+
+
 class Field:
     name: str
     camel_cased_name: str
@@ -28,13 +77,11 @@ class Field:
     is_constant: bool
     constant_data: str | None
 
-    def __init__(self, field: dict) -> None:
+    def __init__(self, field: Mapping) -> None:
         self.__parse(field)
 
     def __parse_constant_data(self):
-        regexs = [re.compile("must be \\w*$"),
-                  re.compile("always \"\\w*\"$")]
-        for regex in regexs:
+        for regex in CONSTANT_DATA_REGEXS:
             match = regex.findall(self.description)
             if match:
                 data: str = match[0].split(" ")[-1]
@@ -48,7 +95,7 @@ class Field:
         self.is_constant = False
         self.constant_data = None
 
-    def __parse(self, field: dict):
+    def __parse(self, field: Mapping):
         self.name = field["name"]
         self.description = field["description"]
         self.camel_cased_name = to_camel_case(self.name)
@@ -70,30 +117,45 @@ class Field:
 
         self.__parse_constant_data()
 
-    def to_java_code(self, indent_spaces: int, type_classification: TypeClassification) -> list[str]:
+    def hash_code_expression(self) -> str:
+        if is_primitive(self.type_):
+            return f"{BOXED_PRIMITIVES[self.type_]}.hashCode(this.{self.camel_cased_name})"
+        return f"Objects.hashCode(this.{self.camel_cased_name})"
+
+    def adapter_name(self) -> str:
+        name = self.type_.replace("List<", "ListOf").replace(">", "")
+        return name[0].lower() + name[1:] + "Adapter"
+
+    def setter_name(self) -> str:
+        name = to_pascal_case(self.name)
+        if self.type_ == "boolean" and name.startswith("Is"):
+            name = name[2:]
+        return "set" + name
+
+    def to_record_component(self, out: CodeEmitter, indent_spaces: int) -> None:
+        indent = " " * indent_spaces
+
+        out.write(f"{indent}/** {self.description} */\n")
+        for annotation in self.annotations:
+            out.write(f"{indent}{annotation}\n")
+        out.write(f"{indent}{self.type_} {self.camel_cased_name}")
+
+    def to_java_code(self, out: CodeEmitter, indent_spaces: int, type_classification: TypeClassification) -> None:
         indent = " " * indent_spaces
 
-        lines = []
         if self.is_constant and type_classification == TypeClassification.DataType:
-            lines = [
-                f"{indent}public static final {self.type_} {self.name.upper()} = {self.constant_data};\n",
-                EMPTY_LINE,
-            ]
+            out.write(
+                f"{indent}public static final {self.type_} {self.name.upper()} = {self.constant_data};\n\n")
 
-        lines.append(f"{indent}/** {self.description} */\n")
+        out.write(f"{indent}/** {self.description} */\n")
 
         for annotation in self.annotations:
-            lines.append(f"{indent}{annotation}\n")
+            out.write(f"{indent}{annotation}\n")
 
-        field_line = f"{indent}public "
         if self.is_constant:
-            field_line += f" final {self.type_} {self.camel_cased_name} = {self.name.upper()};\n"
+            out.write(f"{indent}public  final {self.type_} {self.camel_cased_name} = {self.name.upper()};\n")
         else:
-            field_line += f"{self.type_} {self.camel_cased_name};\n"
-
-        lines.append(field_line)
-
-        return lines
+            out.write(f"{indent}public {self.type_} {self.camel_cased_name};\n")
 
 
 class Type:
@@ -104,18 +166,24 @@ class Type:
     subtype_of: None | list[str]
     subtypes: None | list[str]
     imports: set[str]
+    supertype_field_types: set[str]
+    cached_hash: bool
+    spec_hash: str
 
     DEFAULT_TYPE_CLASSIFICATION = TypeClassification.DataType
     type_classification: TypeClassification
 
-    def __init__(self, telegram_type: dict, type_classification: None | TypeClassification = None):
+    def __init__(self, telegram_type: Mapping, type_classification: None | TypeClassification = None,
+                 context: "GenerationContext | None" = None):
+        if context is None:
+            context = GenerationContext()
         if type_classification is None:
-            self.__parse(telegram_type, self.DEFAULT_TYPE_CLASSIFICATION)
+            self.__parse(telegram_type, self.DEFAULT_TYPE_CLASSIFICATION, context)
         else:
-            self.__parse(telegram_type, type_classification)
+            self.__parse(telegram_type, type_classification, context)
 
-    def __create_new_interface(self, raw_field: dict) -> str:
-        types: list[str] = raw_field["types"]
+    def __create_new_interface(self, raw_field: Mapping, context: "GenerationContext") -> str:
+        types: list[str] = list(raw_field["types"])
         name = to_pascal_case(raw_field["name"])
 
         new_type = name
@@ -129,27 +197,27 @@ class Type:
             data["subtypes"] = list(
                 map(lambda type_: type_[len(ARRAY_OF):], types))
 
-        GROUPED_INTERFACES.append(Type(
-            data, Type.DEFAULT_TYPE_CLASSIFICATION))
-        SPECIFIC_TYPES[frozenset(types)] = name
+        context.grouped_interfaces.append(Type(
+            data, Type.DEFAULT_TYPE_CLASSIFICATION, context))
+        context.specific_types[frozenset(types)] = name
 
         return new_type
 
-    def __parse_fields(self, raw_fields: list[dict]):
-        def datatype_fields(raw_fields: list[dict]) -> list[Field]:
+    def __parse_fields(self, raw_fields: Iterable[Mapping], context: "GenerationContext"):
+        def datatype_fields(raw_fields: Iterable[Mapping]) -> list[Field]:
             fields = map(lambda raw_field: Field(raw_field), raw_fields)
             return list(fields)
 
-        def method_parameters_fields(raw_fields: list[dict]) -> list[Field]:
+        def method_parameters_fields(raw_fields: Iterable[Mapping]) -> list[Field]:
             fields = []
             for raw_field in raw_fields:
                 types = frozenset(raw_field["types"])
 
-                if types in SPECIFIC_TYPES:
-                    raw_field["types"] = [SPECIFIC_TYPES[types]]
+                if types in context.specific_types:
+                    raw_field = SpecView(raw_field, {"types": [context.specific_types[types]]})
                 elif len(types) > 2:
-                    new_type = self.__create_new_interface(raw_field)
-                    raw_field["types"] = [new_type]
+                    new_type = self.__create_new_interface(raw_field, context)
+                    raw_field = SpecView(raw_field, {"types": [new_type]})
 
                 fields.append(Field(raw_field))
             return fields
@@ -165,162 +233,184 @@ class Type:
 
         self.fields = fields
 
-    def __parse(self, telegram_type: dict, type_classification: TypeClassification):
+    def __parse(self, telegram_type: Mapping, type_classification: TypeClassification, context: "GenerationContext"):
         self.type_classification = type_classification
+        self.spec_hash = hash_spec(telegram_type)
+        self.cached_hash = context.cached_hash and type_classification == TypeClassification.DataType
 
         self.name = telegram_type["name"]
         self.description = telegram_type["description"]
 
-        self.subtypes = telegram_type.get("subtypes")
+        subtypes = telegram_type.get("subtypes")
+        self.subtypes = list(subtypes) if subtypes is not None else None
         if self.subtypes is None:
 
             self.is_supertype = False
 
-            self.subtype_of = telegram_type.get("subtype_of")
-            if self.subtype_of is not None and len(self.subtype_of) > 1:
+            subtype_of = telegram_type.get("subtype_of")
+            if subtype_of is not None and len(subtype_of) > 1:
                 raise Exception(
                     "Expected one subtype_of, but given many subtype_of!")
+            self.subtype_of = list(subtype_of) if subtype_of is not None else None
 
         else:
             self.is_supertype = True
+            self.subtype_of = None
 
         self.imports = set()
-        self.__parse_fields(telegram_type.get("fields", []))
-
-    def make_builder(self, indent_spaces: int) -> list[str]:
+        self.supertype_field_types = set()
+        self.__parse_fields(telegram_type.get("fields", []), context)
+
+    def clone(self) -> "Type":
+        type_ = copy(self)
+        type_.subtype_of = list(self.subtype_of) if self.subtype_of is not None else None
+        type_.imports = set(self.imports)
+        type_.supertype_field_types = set(self.supertype_field_types)
+        return type_
+
+    def render_key(self) -> tuple:
+        return (
+            self.spec_hash,
+            self.type_classification,
+            tuple(self.subtype_of or ()),
+            tuple(map(lambda field: field.type_, self.fields)),
+            tuple(sorted(self.supertype_field_types)),
+            self.cached_hash,
+        )
+
+    def make_builder(self, out: CodeEmitter, indent_spaces: int) -> None:
         indent = " " * indent_spaces
         instanceName = "buildingType"
-        lines = [
-            f"{indent}public static final class Builder {{\n",
-            EMPTY_LINE,
-            f"{indent * 2}private {self.name} {instanceName};\n",
-            EMPTY_LINE,
-            f"{indent * 2}public Builder() {{\n",
-            f"{indent * 3}buildingType = new {self.name}();\n",
-            f"{indent * 2}}}\n",
-        ]
+        out.write(
+            f"{indent}public static final class Builder {{\n"
+            "\n"
+            f"{indent * 2}private {self.name} {instanceName};\n"
+            "\n"
+            f"{indent * 2}public Builder() {{\n"
+            f"{indent * 3}buildingType = new {self.name}();\n"
+            f"{indent * 2}}}\n"
+        )
 
         for field in self.fields:
             if field.is_constant:
                 continue
 
-            methodName = to_pascal_case(field.name)
-
-            if field.type_ == "boolean" and methodName.startswith("Is"):
-                methodName = methodName[2:]
-            methodName = "set" + methodName
+            methodName = field.setter_name()
 
-            lines.extend([
-                EMPTY_LINE,
-                f"{indent * 2}public Builder {methodName}({field.type_} {field.camel_cased_name}) {{\n",
+            out.write(
+                "\n"
+                f"{indent * 2}public Builder {methodName}({field.type_} {field.camel_cased_name}) {{\n"
                 f"{indent * 3}{instanceName}.{field.camel_cased_name} = {field.camel_cased_name};\n"
-                f"{indent * 3}return this;\n",
-                f"{indent * 2}}}\n",
-            ])
-
-        lines.extend([
-            EMPTY_LINE,
-            f"{indent * 2}public {self.name} build() {{\n",
-            f"{indent * 3}return {instanceName};\n",
-            f"{indent * 2}}}\n",
-            f"{indent}}}\n",
-            EMPTY_LINE
-        ])
-
-        return lines
-
-    def make_method_equals(self, indent_spaces: int) -> list[str]:
+                f"{indent * 3}return this;\n"
+                f"{indent * 2}}}\n"
+            )
+
+        out.write(
+            "\n"
+            f"{indent * 2}public {self.name} build() {{\n"
+            f"{indent * 3}return {instanceName};\n"
+            f"{indent * 2}}}\n"
+            f"{indent}}}\n"
+            "\n"
+        )
+
+    def make_method_equals(self, out: CodeEmitter, indent_spaces: int) -> None:
         indent = " " * indent_spaces
-        lines = [
-            f"{indent}@Override\n",
+        out.write(
+            f"{indent}@Override\n"
             f"{indent}public final boolean equals(Object obj) {{\n"
             f"{indent * 2}if (this == obj) return true;\n"
-        ]
+        )
 
         if not self.fields:
-            lines.append(
-                f"{indent * 2}if (!(obj instanceof {self.name})) return false;\n")
-            lines.append(f"{indent * 2}return true;\n")
-            lines.append(f"{indent}}}\n")
-            return lines
+            out.write(
+                f"{indent * 2}if (!(obj instanceof {self.name})) return false;\n"
+                f"{indent * 2}return true;\n"
+                f"{indent}}}\n"
+            )
+            return
 
-        lines.append(
-            f"{indent * 2}if (!(obj instanceof {self.name} other)) return false;\n")
+        out.write(f"{indent * 2}if (!(obj instanceof {self.name} other)) return false;\n")
 
-        exists_objects = False
         last = len(self.fields) - 1
         for i, field in enumerate(self.fields):
-            line = ""
+            prefix = f"{indent * 2}return " if i == 0 else f"{indent * 4}&& "
+            suffix = ";\n" if i == last else "\n"
+
+            name = field.camel_cased_name
             if is_primitive(field.type_):
                 if field.type_ == "float":
-                    line = f"Float.floatToIntBits({field.camel_cased_name}) == Float.floatToIntBits(other.{field.camel_cased_name})"
+                    out.write(f"{prefix}Float.floatToIntBits({name}) == Float.floatToIntBits(other.{name}){suffix}")
                 else:
-                    line = f"{field.camel_cased_name} == other.{field.camel_cased_name}"
-            else:
-                line = f"Objects.equals({field.camel_cased_name}, other.{field.camel_cased_name})"
-                exists_objects = True
-
-            if i == 0:
-                line = f"{indent * 2}return {line}"
-            else:
-                line = f"{indent * 4}&& {line}"
-
-            if i == last:
-                line += ";\n"
+                    out.write(f"{prefix}{name} == other.{name}{suffix}")
             else:
-                line += "\n"
-
-            lines.append(line)
-
-        lines.append(f"{indent}}}\n")
+                out.write(f"{prefix}Objects.equals({name}, other.{name}){suffix}")
 
-        if exists_objects:
-            self.imports.add(Imports.Objects.as_line())
+        out.write(f"{indent}}}\n")
 
-        return lines
-
-    def make_method_hash_code(self, indent_spaces: int) -> list[str]:
+    def make_method_hash_code(self, out: CodeEmitter, indent_spaces: int) -> None:
         indent = " " * indent_spaces
-        lines = [
-            f"{indent}@Override\n",
+        out.write(
+            f"{indent}@Override\n"
             f"{indent}public final int hashCode() {{\n"
-        ]
+        )
 
         if not self.fields:
-            lines.extend([
-                f"{indent * 2}int prime = 31;\n",
-                f"{indent * 2}return prime;\n",
-                f"{indent}}}\n",
-            ])
-            return lines
-
-        fields = ", ".join(
-            map(lambda field: field.camel_cased_name, self.fields))
-        lines.append(f"{indent * 2} return Objects.hash({fields});\n")
-        lines.append(f"{indent}}}\n")
-
-        self.imports.add(Imports.Objects.as_line())
-
-        return lines
+            out.write(
+                f"{indent * 2}int prime = 31;\n"
+                f"{indent * 2}return prime;\n"
+                f"{indent}}}\n"
+            )
+            return
+
+        if self.cached_hash:
+            out.write(
+                f"{indent * 2}int result = cachedHashCode;\n"
+                f"{indent * 2}if (result != 0 || cachedHashCodeIsZero) {{\n"
+                f"{indent * 3}return result;\n"
+                f"{indent * 2}}}\n"
+                "\n"
+                f"{indent * 2}result = 1;\n"
+            )
+        else:
+            out.write(f"{indent * 2}int result = 1;\n")
 
-    def make_method_to_string(self, indent_spaces: int) -> list[str]:
+        # Same value as Objects.hash(...), without the varargs array and boxing.
+        for field in self.fields:
+            out.write(f"{indent * 2}result = 31 * result + {field.hash_code_expression()};\n")
+
+        if self.cached_hash:
+            out.write(
+                "\n"
+                f"{indent * 2}if (result == 0) {{\n"
+                f"{indent * 3}cachedHashCodeIsZero = true;\n"
+                f"{indent * 2}}} else {{\n"
+                f"{indent * 3}cachedHashCode = result;\n"
+                f"{indent * 2}}}\n"
+            )
+        out.write(
+            f"{indent * 2}return result;\n"
+            f"{indent}}}\n"
+        )
+
+    def make_method_to_string(self, out: CodeEmitter, indent_spaces: int) -> None:
         indent = " " * indent_spaces
-        lines = [
-            f"{indent}@Override\n",
+        out.write(
+            f"{indent}@Override\n"
             f"{indent}public final String toString() {{\n"
-        ]
+        )
 
         if not self.fields:
-            lines.extend([
-                f"{indent * 2}return \"{self.name}[]\";\n",
-                f"{indent}}}\n",
-            ])
-            return lines
-
-        lines.extend([
-            f"{indent * 2}var builder = new StringBuilder();\n",
+            out.write(
+                f"{indent * 2}return \"{self.name}[]\";\n"
+                f"{indent}}}\n"
+            )
+            return
+
+        out.write(
+            f"{indent * 2}var builder = new StringBuilder();\n"
             f"{indent * 2}builder\n"
-        ])
+        )
         name = f"{self.name}["
 
         for i, field in enumerate(self.fields):
@@ -328,152 +418,523 @@ class Type:
                 name += f"{field.camel_cased_name}="
             else:
                 name = f", {field.camel_cased_name}="
-            lines.append(f"{indent * 4}.append(\"{name}\")\n")
-            lines.append(f"{indent * 4}.append({field.camel_cased_name})\n")
+            out.write(
+                f"{indent * 4}.append(\"{name}\")\n"
+                f"{indent * 4}.append({field.camel_cased_name})\n"
+            )
+
+        out.write(
+            f"{indent * 4}.append(\"]\");\n"
+            f"{indent * 2}return builder.toString();\n"
+            f"{indent}}}\n"
+        )
+
+    def __delegated_fields(self) -> list[Field]:
+        fields = []
+        adapter_names = set()
+        for field in self.fields:
+            if field.type_ in JSON_READERS:
+                continue
+            if field.adapter_name() not in adapter_names:
+                adapter_names.add(field.adapter_name())
+                fields.append(field)
+        return fields
 
-        lines.extend([
-            f"{indent * 4}.append(\"]\");\n",
-            f"{indent * 2}return builder.toString();\n",
-            f"{indent}}}\n",
-        ])
+    def __runtime_typed(self, field: Field) -> bool:
+        return field.type_ in self.supertype_field_types
 
-        return lines
+    def __read_expression(self, field: Field) -> str:
+        if field.type_ in JSON_READERS:
+            return JSON_READERS[field.type_]
+        return f"{field.adapter_name()}.read(in)"
 
-    def to_java_code(self, base_packagename: str) -> list[str]:
-        lines = [
-            f"package {base_packagename}.{self.type_classification.package()};\n"
-        ]
-        indent_spaces = 2
+    def __make_adapter_read(self, out: CodeEmitter, indent_spaces: int, mode: OutputMode) -> None:
+        indent = " " * indent_spaces
+        readable_fields = list(filter(lambda field: not field.is_constant, self.fields))
+
+        out.write(
+            f"{indent * 2}@Override\n"
+            f"{indent * 2}public {self.name} read(JsonReader in) throws IOException {{\n"
+            f"{indent * 3}if (in.peek() == JsonToken.NULL) {{\n"
+            f"{indent * 4}in.nextNull();\n"
+            f"{indent * 4}return null;\n"
+            f"{indent * 3}}}\n"
+            "\n"
+        )
+
+        if mode == OutputMode.Records:
+            for field in readable_fields:
+                default = "false" if field.type_ == "boolean" else "0" if is_primitive(field.type_) else "null"
+                out.write(f"{indent * 3}{field.type_} {field.camel_cased_name} = {default};\n")
+        else:
+            out.write(f"{indent * 3}var value = new {self.name}();\n")
+
+        out.write(
+            f"{indent * 3}in.beginObject();\n"
+            f"{indent * 3}while (in.hasNext()) {{\n"
+        )
+        if not readable_fields:
+            out.write(
+                f"{indent * 4}in.nextName();\n"
+                f"{indent * 4}in.skipValue();\n"
+            )
+        else:
+            out.write(
+                f"{indent * 4}var jsonName = in.nextName();\n"
+                f"{indent * 4}if (in.peek() == JsonToken.NULL) {{\n"
+                f"{indent * 5}in.nextNull();\n"
+                f"{indent * 5}continue;\n"
+                f"{indent * 4}}}\n"
+                "\n"
+                f"{indent * 4}switch (jsonName) {{\n"
+            )
+            target = "" if mode == OutputMode.Records else "value."
+            for field in readable_fields:
+                out.write(
+                    f"{indent * 5}case \"{field.name}\" -> "
+                    f"{target}{field.camel_cased_name} = {self.__read_expression(field)};\n")
+            out.write(
+                f"{indent * 5}default -> in.skipValue();\n"
+                f"{indent * 4}}}\n"
+            )
+        out.write(
+            f"{indent * 3}}}\n"
+            f"{indent * 3}in.endObject();\n"
+        )
+
+        if mode == OutputMode.Records:
+            arguments = ", ".join(map(
+                lambda field: cast(str, field.constant_data) if field.is_constant else field.camel_cased_name,
+                self.fields))
+            out.write(f"{indent * 3}return new {self.name}({arguments});\n")
+        else:
+            out.write(f"{indent * 3}return value;\n")
+        out.write(f"{indent * 2}}}\n")
 
-        equals_method = self.make_method_equals(indent_spaces)
-        hash_code_method = self.make_method_hash_code(indent_spaces)
-        to_string_method = self.make_method_to_string(indent_spaces)
+    def __make_adapter_write(self, out: CodeEmitter, indent_spaces: int, mode: OutputMode) -> None:
+        indent = " " * indent_spaces
+        accessor = "()" if mode == OutputMode.Records else ""
+
+        out.write(
+            f"{indent * 2}@Override\n"
+            f"{indent * 2}public void write(JsonWriter out, {self.name} value) throws IOException {{\n"
+            f"{indent * 3}if (value == null) {{\n"
+            f"{indent * 4}out.nullValue();\n"
+            f"{indent * 4}return;\n"
+            f"{indent * 3}}}\n"
+            "\n"
+            f"{indent * 3}out.beginObject();\n"
+        )
+
+        # JsonWriter drops the name of a null value, as Gson doesn't serialize nulls by default.
+        for field in self.fields:
+            value = f"value.{field.camel_cased_name}{accessor}"
+            if field.type_ == "float":
+                out.write(f"{indent * 3}out.name(\"{field.name}\").value((Number) {value});\n")
+            elif field.type_ in JSON_READERS:
+                out.write(f"{indent * 3}out.name(\"{field.name}\").value({value});\n")
+            elif self.__runtime_typed(field):
+                out.write(
+                    f"{indent * 3}out.name(\"{field.name}\");\n"
+                    f"{indent * 3}writeRuntimeType(out, {value});\n"
+                )
+            else:
+                out.write(
+                    f"{indent * 3}out.name(\"{field.name}\");\n"
+                    f"{indent * 3}{field.adapter_name()}.write(out, {value});\n"
+                )
 
-        all_imports = map(lambda field: field.imports, self.fields)
-        self.imports = reduce(lambda lhs, rhs: lhs.union(
-            rhs), all_imports, self.imports)
+        out.write(
+            f"{indent * 3}out.endObject();\n"
+            f"{indent * 2}}}\n"
+        )
 
-        if len(self.imports) > 0:
-            lines.append(EMPTY_LINE)
-            for used_import in self.imports:
-                lines.append(used_import + "\n")
+    def make_gson_adapter(self, out: CodeEmitter, indent_spaces: int, mode: OutputMode) -> None:
+        indent = " " * indent_spaces
+        runtime_typed = any(map(self.__runtime_typed, self.fields))
+        delegated_fields = self.__delegated_fields()
+
+        out.write(f"{indent}public static final class GsonAdapter extends TypeAdapter<{self.name}> {{\n")
+        if runtime_typed:
+            out.write(f"\n{indent * 2}private final Gson gson;\n")
+        if delegated_fields:
+            out.write("\n")
+        for field in delegated_fields:
+            out.write(f"{indent * 2}private final TypeAdapter<{field.type_}> {field.adapter_name()};\n")
+
+        out.write(
+            "\n"
+            f"{indent * 2}public GsonAdapter(Gson gson) {{\n"
+        )
+        if runtime_typed:
+            out.write(f"{indent * 3}this.gson = gson;\n")
+        for field in delegated_fields:
+            if field.type_.startswith("List<"):
+                adapter = f"gson.getAdapter(new TypeToken<{field.type_}>() {{}})"
+            else:
+                adapter = f"gson.getAdapter({field.type_}.class)"
+            out.write(f"{indent * 3}{field.adapter_name()} = {adapter};\n")
+        out.write(f"{indent * 2}}}\n\n")
+
+        self.__make_adapter_read(out, indent_spaces, mode)
+        out.write("\n")
+        self.__make_adapter_write(out, indent_spaces, mode)
+
+        if runtime_typed:
+            # Sealed interfaces are written by the adapter of the actual subtype.
+            out.write(
+                "\n"
+                f"{indent * 2}@SuppressWarnings(\"unchecked\")\n"
+                f"{indent * 2}private void writeRuntimeType(JsonWriter out, Object fieldValue) throws IOException {{\n"
+                f"{indent * 3}if (fieldValue == null) {{\n"
+                f"{indent * 4}out.nullValue();\n"
+                f"{indent * 4}return;\n"
+                f"{indent * 3}}}\n"
+                f"{indent * 3}((TypeAdapter<Object>) gson.getAdapter(fieldValue.getClass())).write(out, fieldValue);\n"
+                f"{indent * 2}}}\n"
+            )
+        out.write(f"{indent}}}\n")
+
+    def make_validate(self, out: CodeEmitter, indent_spaces: int, mode: OutputMode) -> None:
+        indent = " " * indent_spaces
+        accessor = "()" if mode == OutputMode.Records else ""
+
+        out.write(f"{indent}public static void validate({self.name} params) {{\n")
+        required_fields = filter(
+            lambda field: field.required and not field.is_constant and not is_primitive(field.type_), self.fields)
+        for field in required_fields:
+            out.write(
+                f"{indent * 2}if (params.{field.camel_cased_name}{accessor} == null) {{\n"
+                f"{indent * 3}throw new IllegalArgumentException(\n"
+                f"{indent * 5}\"Required field \\\"{field.name}\\\" of {self.name} is not set!\");\n"
+                f"{indent * 2}}}\n"
+            )
+        out.write(f"{indent}}}\n")
+
+    def make_record_builder(self, out: CodeEmitter, indent_spaces: int) -> None:
+        indent = " " * indent_spaces
+        out.write(f"{indent}public static final class Builder {{\n")
 
-        for _ in range(2):
-            lines.append(EMPTY_LINE)
+        for field in self.fields:
+            if not field.is_constant:
+                out.write(f"\n{indent * 2}private {field.type_} {field.camel_cased_name};\n")
+
+        for field in self.fields:
+            if field.is_constant:
+                continue
 
-        lines.append(generate_description(self.description, indent_spaces=0))
+            out.write(
+                "\n"
+                f"{indent * 2}public Builder {field.setter_name()}({field.type_} {field.camel_cased_name}) {{\n"
+                f"{indent * 3}this.{field.camel_cased_name} = {field.camel_cased_name};\n"
+                f"{indent * 3}return this;\n"
+                f"{indent * 2}}}\n"
+            )
+
+        arguments = ", ".join(map(
+            lambda field: cast(str, field.constant_data) if field.is_constant else field.camel_cased_name,
+            self.fields))
+        out.write(
+            "\n"
+            f"{indent * 2}public {self.name} build() {{\n"
+            f"{indent * 3}return new {self.name}({arguments});\n"
+            f"{indent * 2}}}\n"
+            f"{indent}}}\n"
+        )
+
+    def needs_record_builder(self) -> bool:
+        optional_fields = filter(lambda field: not field.required and not field.is_constant, self.fields)
+        return len(list(optional_fields)) >= RECORD_BUILDER_MIN_OPTIONAL_FIELDS
+
+    def record_body(self, out: CodeEmitter, indent_spaces: int) -> None:
+        indent = " " * indent_spaces
+
+        out.write(f"public record {self.name}(")
+        last = len(self.fields) - 1
+        for i, field in enumerate(self.fields):
+            out.write("\n")
+            field.to_record_component(out, indent_spaces * 2)
+            if i != last:
+                out.write(",\n")
+        out.write(")")
+
+        if self.subtype_of is not None:
+            out.write(" implements " + ", ".join(self.subtype_of))
+
+        constants = list(filter(lambda field: field.is_constant, self.fields))
+        out.write(" {\n")
+        if constants and self.type_classification == TypeClassification.DataType:
+            out.write("\n")
+            for field in constants:
+                out.write(f"{indent}public static final {field.type_} {field.name.upper()} = {field.constant_data};\n")
+
+        if constants:
+            out.write(f"\n{indent}public {self.name} {{\n")
+            for field in constants:
+                out.write(f"{indent * 2}{field.camel_cased_name} = {field.constant_data};\n")
+            out.write(f"{indent}}}\n")
+
+        if self.needs_record_builder():
+            out.write("\n")
+            self.make_record_builder(out, indent_spaces)
+
+        if self.type_classification == TypeClassification.MethodParameters:
+            out.write("\n")
+            self.make_validate(out, indent_spaces, OutputMode.Records)
+
+        out.write("\n")
+        self.make_gson_adapter(out, indent_spaces, OutputMode.Records)
+        out.write("}")
+
+    def collect_imports(self, mode: OutputMode = OutputMode.Classes) -> set[str]:
+        imports = set(self.imports)
+        for field in self.fields:
+            imports.update(field.imports)
+
+        if self.fields and mode == OutputMode.Classes:
+            imports.add(Imports.Objects.as_line())
+
+        if not self.is_supertype:
+            imports.update(map(lambda import_: import_.as_line(), ADAPTER_IMPORTS))
+            if any(map(lambda field: field.type_.startswith("List<"), self.fields)):
+                imports.add(Imports.TypeToken.as_line())
+
+        return imports
+
+    def java_header(self, base_packagename: str, mode: OutputMode = OutputMode.Classes) -> str:
+        out = CodeEmitter()
+        out.write(f"package {base_packagename}.{self.type_classification.package()};\n")
+
+        imports = self.collect_imports(mode)
+        if len(imports) > 0:
+            out.write("\n")
+            out.lines(render_imports(imports, base_packagename))
+
+        out.write("\n\n")
+        return out.getvalue()
+
+    def java_body(self, mode: OutputMode = OutputMode.Classes) -> str:
+        out = CodeEmitter()
+        indent_spaces = 2
+
+        out.write(generate_description(self.description, indent_spaces=0))
 
         if self.is_supertype:
             subtypes = ", ".join(cast(list[str], self.subtypes))
-            lines.append(
-                f"sealed public interface {self.name} permits {subtypes} {{}}")
-            return lines
+            out.write(f"sealed public interface {self.name} permits {subtypes} {{}}")
+            return out.getvalue()
+
+        if mode == OutputMode.Records:
+            self.record_body(out, indent_spaces)
+            return out.getvalue()
 
         classname = f"public final class {self.name}"
         if self.subtype_of is not None:
             supertypes = ", ".join(self.subtype_of)
             classname += f" implements {supertypes}"
 
-        classname += " {\n"
-        lines.append(classname)
-        lines.append(EMPTY_LINE)
+        out.write(classname + " {\n\n")
 
-        lines.extend(self.make_builder(indent_spaces))
+        self.make_builder(out, indent_spaces)
 
         last = len(self.fields) - 1
         for i, field in enumerate(self.fields):
-            lines.extend(field.to_java_code(
-                indent_spaces, self.type_classification))
+            field.to_java_code(out, indent_spaces, self.type_classification)
             if i != last:
-                lines.append(EMPTY_LINE)
-
-        lines.append(EMPTY_LINE)
-        lines.extend(equals_method)
-        lines.append(EMPTY_LINE)
-        lines.extend(hash_code_method)
-        lines.append(EMPTY_LINE)
-        lines.extend(to_string_method)
-
-        lines.append("}")
+                out.write("\n")
+
+        if self.cached_hash and self.fields:
+            # Cached once the type is built: instances must not be changed after Builder.build().
+            indent = " " * indent_spaces
+            out.write(
+                "\n"
+                f"{indent}private transient int cachedHashCode;\n"
+                f"{indent}private transient boolean cachedHashCodeIsZero;\n"
+            )
+
+        out.write("\n")
+        self.make_method_equals(out, indent_spaces)
+        out.write("\n")
+        self.make_method_hash_code(out, indent_spaces)
+        out.write("\n")
+        self.make_method_to_string(out, indent_spaces)
+        if self.type_classification == TypeClassification.MethodParameters:
+            out.write("\n")
+            self.make_validate(out, indent_spaces, OutputMode.Classes)
+        out.write("\n")
+        self.make_gson_adapter(out, indent_spaces, OutputMode.Classes)
+
+        out.write("}")
+
+        return out.getvalue()
+
+    def to_java_code(self, base_packagename: str, mode: OutputMode = OutputMode.Classes) -> str:
+        return self.java_header(base_packagename, mode) + self.java_body(mode)
+
+
+class TypeRegistry:
+    types: list[Type]
+    by_name: dict[str, Type]
+    by_package: dict[TypeClassification, list[Type]]
+    named: dict[str, list[Type]]
+
+    def __init__(self, types: Iterable[Type] = ()) -> None:
+        self.types = []
+        self.by_name = {}
+        self.by_package = {}
+        self.named = {}
+
+        for type_ in types:
+            self.add(type_)
+
+    def __iter__(self) -> Iterator[Type]:
+        return iter(self.types)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def __getitem__(self, name: str) -> Type:
+        return self.by_name[name]
+
+    def __copy__(self) -> "TypeRegistry":
+        return TypeRegistry(self.types)
+
+    def add(self, type_: Type) -> None:
+        self.types.append(type_)
+        self.by_name.setdefault(type_.name, type_)
+        self.by_package.setdefault(type_.type_classification, []).append(type_)
+        self.named.setdefault(type_.name, []).append(type_)
+
+    def get(self, name: str) -> Type | None:
+        return self.by_name.get(name)
+
+    def in_package(self, type_classification: TypeClassification) -> list[Type]:
+        return self.by_package.get(type_classification, [])
+
+    def all_named(self, name: str) -> list[Type]:
+        return self.named.get(name, [])
+
+    def bind(self, subtype_name: str, supertype: Type) -> None:
+        # Grouped interfaces of different parameters may share a name, so every
+        # type registered under the name is bound, not only the first one.
+        for type_ in self.all_named(subtype_name):
+            if type_.subtype_of is not None:
+                type_.subtype_of.append(supertype.name)
+            else:
+                type_.subtype_of = [supertype.name]
 
-        return lines
+    def clear(self) -> None:
+        self.types = []
+        self.by_name = {}
+        self.by_package = {}
+        self.named = {}
 
 
-SPECIFIC_TYPES: dict[frozenset[str], str] = {}
-TYPE_STORAGE: list[Type] = []
-GROUPED_INTERFACES: list[Type] = []
-DYNAMIC_IMPORTS: dict[str, TypeClassification] = {
+DEFAULT_DYNAMIC_IMPORTS: dict[str, TypeClassification] = {
     "InputFile": TypeClassification.DataType,
     "Id": TypeClassification.DataType,
     "MessageOrBoolean": TypeClassification.DataType,
 }
 
+HANDWRITTEN_DEPENDENCIES: dict[str, list[str]] = {
+    "MessageOrBoolean": ["Message"],
+}
+
+
+class GenerationContext:
+    specific_types: dict[frozenset[str], str]
+    type_storage: TypeRegistry
+    grouped_interfaces: list[Type]
+    dynamic_imports: dict[str, TypeClassification]
+    cached_hash: bool
+
+    def __init__(self, cached_hash: bool = False) -> None:
+        self.specific_types = {}
+        self.type_storage = TypeRegistry()
+        self.grouped_interfaces = []
+        self.dynamic_imports = dict(DEFAULT_DYNAMIC_IMPORTS)
+        self.cached_hash = cached_hash
+
 
 class TypeGenerator:
-    base_packagename: str
+    context: GenerationContext
+    profiler: Profiler
 
-    def __init__(self, base_packagename: str) -> None:
-        self.base_packagename = base_packagename
+    def __init__(self, context: GenerationContext | None = None,
+                 profiler: Profiler = DISABLED_PROFILER) -> None:
+        self.context = context if context is not None else GenerationContext()
+        self.profiler = profiler
 
-    @staticmethod
-    def __put_dynamic_import_if_absent(type_: Type) -> None:
-        if type_.name not in DYNAMIC_IMPORTS:
-            DYNAMIC_IMPORTS[type_.name] = type_.type_classification
+    def __put_dynamic_import_if_absent(self, type_: Type) -> None:
+        if type_.name not in self.context.dynamic_imports:
+            self.context.dynamic_imports[type_.name] = type_.type_classification
 
-    def add_type(self, telegram_type: dict, type_classification: TypeClassification):
-        type_ = Type(telegram_type, type_classification)
+    def add_type(self, telegram_type: Mapping, type_classification: TypeClassification) -> Type:
+        type_ = Type(telegram_type, type_classification, self.context)
+        self.add_parsed_type(type_)
+        return type_
 
-        TypeGenerator.__put_dynamic_import_if_absent(type_)
+    def add_parsed_type(self, type_: Type) -> None:
+        self.__put_dynamic_import_if_absent(type_)
 
-        TYPE_STORAGE.append(type_)
+        self.context.type_storage.add(type_)
 
     def __append_grouped_interfaces(self) -> None:
-        def bind(type_: Type, supertype: Type) -> None:
-            if type_.subtype_of is not None:
-                type_.subtype_of.append(supertype.name)
-            else:
-                type_.subtype_of = [supertype.name]
+        type_storage = self.context.type_storage
 
         def bind_interface_and_subtypes(interface: Type):
             for subtype in cast(list[str], interface.subtypes):
+                type_storage.bind(subtype, interface)
 
-                for type_ in filter(lambda type_: type_.name == subtype, TYPE_STORAGE):
-                    bind(type_, interface)
-
-        for new_interface in GROUPED_INTERFACES:
-            TypeGenerator.__put_dynamic_import_if_absent(new_interface)
+        for new_interface in self.context.grouped_interfaces:
+            self.__put_dynamic_import_if_absent(new_interface)
 
             if new_interface.is_supertype:
                 bind_interface_and_subtypes(new_interface)
 
-            TYPE_STORAGE.append(new_interface)
+            type_storage.add(new_interface)
 
-        GROUPED_INTERFACES.clear()
+        self.context.grouped_interfaces.clear()
 
     def __ensure_dynamic_imports(self):
-        for type_ in TYPE_STORAGE:
+        dynamic_imports = self.context.dynamic_imports
+
+        for type_ in self.context.type_storage:
             type_ = cast(Type, type_)
 
             for field in type_.fields:
 
                 base_type = unwrap_type(field.type_)
-                same_type = base_type in DYNAMIC_IMPORTS
+                same_type = base_type in dynamic_imports
                 if not same_type:
                     continue
 
-                if type_.type_classification == DYNAMIC_IMPORTS[base_type]:
+                if type_.type_classification == dynamic_imports[base_type]:
                     continue
 
-                other_package = DYNAMIC_IMPORTS[base_type].package()
-                type_.imports.add(
-                    f"import {self.base_packagename}.{other_package}.{base_type};")
+                other_package = dynamic_imports[base_type].package()
+                type_.imports.add(import_line(other_package, base_type))
+
+    def __mark_supertype_fields(self):
+        type_storage = self.context.type_storage
+        supertypes = set(map(lambda type_: type_.name, filter(lambda type_: type_.is_supertype, type_storage)))
+
+        for type_ in type_storage:
+            type_.supertype_field_types = set(filter(
+                lambda type_name: type_name in supertypes, map(lambda field: field.type_, type_.fields)))
 
     def __ensure_correctness(self):
-        self.__append_grouped_interfaces()
-        self.__ensure_dynamic_imports()
+        with self.profiler.phase("grouped interface binding"):
+            self.__append_grouped_interfaces()
+        with self.profiler.phase("dynamic import resolution"):
+            self.__ensure_dynamic_imports()
+            self.__mark_supertype_fields()
 
-    def types(self) -> list[Type]:
+    def types(self) -> TypeRegistry:
         self.__ensure_correctness()
-        types = copy(TYPE_STORAGE)
-        TYPE_STORAGE.clear()
+        types = copy(self.context.type_storage)
+        self.context.type_storage.clear()
         return types
@@ -0,0 +1,83 @@
+from hashlib import sha256
+import json
+import os
+
+DEFAULT_CACHE_DIR = ".cache/specs"
+DEFAULT_TIMEOUT = 30
+
+
+class SpecCache:
+    cache_dir: str
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+
+    def __key(self, url: str) -> str:
+        return sha256(url.encode("utf-8")).hexdigest()
+
+    def spec_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, self.__key(url) + ".json")
+
+    def meta_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, self.__key(url) + ".meta.json")
+
+    def has(self, url: str) -> bool:
+        return os.path.exists(self.spec_path(url)) and os.path.exists(self.meta_path(url))
+
+    def __load_meta(self, url: str) -> dict:
+        if not self.has(url):
+            return {}
+
+        try:
+            with open(self.meta_path(url), "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def __write_atomic(path: str, content: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def __store(self, url: str, content: str, headers) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        self.__write_atomic(self.spec_path(url), content)
+        self.__write_atomic(self.meta_path(url), json.dumps(meta, indent=2))
+
+    def fetch(self, url: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        from requests import RequestException, get
+
+        meta = self.__load_meta(url)
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = get(url=url, headers=headers, timeout=timeout)
+        except RequestException as error:
+            if meta:
+                print(f"Can't reach {url} ({error}), using cached specs.")
+                return self.spec_path(url)
+            raise Exception("Can't download Telegram API specs!") from error
+
+        if response.status_code == 304 and meta:
+            return self.spec_path(url)
+        if response.status_code != 200:
+            raise Exception("Can't download Telegram API specs!")
+
+        self.__store(url, response.text, response.headers)
+        return self.spec_path(url)
+
+    def cached(self, url: str) -> str:
+        if not self.has(url):
+            raise Exception(f"No cached Telegram API specs for {url}!")
+        return self.spec_path(url)
@@ -1,27 +1,40 @@
-from requests import get
-from copy import deepcopy
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from typing import Mapping
+import cProfile
 import json
+import sys
 
-from generators.typegen import TypeClassification
+from generators.typegen import OutputMode, TypeClassification
 from generators.helpers import to_pascal_case
-from writer.code_writer import CodeWriter
+from generators.profiler import Profiler
+from generators.selection import Selection
+from generators.spec_view import SpecView
+from generators.type_mapping import TYPE_MAPPER
+from loader.spec_cache import DEFAULT_CACHE_DIR, DEFAULT_TIMEOUT, SpecCache
+from writer.code_writer import BASE_PACKAGE_NAME, CodeWriter, RENDER_POOL_PROCESS, RENDER_POOLS
+from writer.manifest import WriteSummary
+from writer.output import FSYNC_MODES, FSYNC_NONE
+from writer.watcher import DEFAULT_POLL_INTERVAL, SpecWatcher
 
 SPECS_PATH = "https://raw.githubusercontent.com/PaulSonOfLars/telegram-bot-api-spec/main/api.json"
+DEFAULT_OUTPUT_DIR = "output/"
 IGNORE_TYPES = [
     "InputFile"
 ]
 
 
-def download_specs(output_file: str):
-    response = get(url=SPECS_PATH)
-    if response.status_code != 200:
-        raise Exception("Can't download Telegram API specs!")
+def download_specs(args: Namespace) -> str:
+    if args.spec is not None:
+        return args.spec
 
-    with open(output_file, "w") as file:
-        file.write(response.text)
+    cache = SpecCache(args.cache_dir)
+    if args.offline:
+        return cache.cached(args.spec_url)
 
+    return cache.fetch(args.spec_url, args.timeout)
 
-def add_datatypes(writer: CodeWriter, specs: dict):
+
+def add_datatypes(writer: CodeWriter, specs: Mapping):
     datatype_names = specs["types"].keys()
     datatypes = map(lambda name: specs["types"][name], datatype_names)
 
@@ -33,19 +46,18 @@ def add_datatypes(writer: CodeWriter, specs: dict):
         writer.add_type(datatype, TypeClassification.DataType)
 
 
-def add_method_params(writer: CodeWriter, specs: dict):
+def add_method_params(writer: CodeWriter, specs: Mapping):
     method_names = specs["methods"].keys()
-    methods = map(lambda name: deepcopy(specs["methods"][name]), method_names)
+    methods = map(lambda name: specs["methods"][name], method_names)
 
-    for method_params in methods:
-        if "fields" not in method_params:
+    for method in methods:
+        if "fields" not in method:
             continue
 
-        method_params["name"] = to_pascal_case(
-            method_params["name"]) + "Parameters"
+        method_params = SpecView(method, {"name": to_pascal_case(method["name"]) + "Parameters"})
         writer.add_type(method_params, TypeClassification.MethodParameters)
 
-def add_methods(writer: CodeWriter, specs: dict):
+def add_methods(writer: CodeWriter, specs: Mapping):
     method_names = specs["methods"].keys()
     methods = map(lambda name: specs["methods"][name], method_names)
 
@@ -53,19 +65,129 @@ def add_methods(writer: CodeWriter, specs: dict):
         writer.add_method(method)
 
 
-if __name__ == "__main__":
-    api_json_file = "api.json"
-    download_specs(output_file=api_json_file)
-
-    output_dir = "output/"
-
-    with open(api_json_file, "r") as file:
-        api_specs = json.load(file)
+def parse_target(value: str) -> tuple[str, str]:
+    base_packagename, separator, outdir = value.partition(":")
+    if not separator or not base_packagename or not outdir:
+        raise ArgumentTypeError(f"Expected BASE_PACKAGE:OUTDIR, but given {value}!")
+    return (outdir, base_packagename)
+
+
+def parse_names(value: str) -> list[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def make_selection(args: Namespace) -> Selection | None:
+    return Selection(args.only) if args.only else None
+
+
+def output_mode(args: Namespace) -> OutputMode:
+    return OutputMode.Records if args.java_records else OutputMode.Classes
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description="Generates Telegram types for TBot project.")
+    parser.add_argument("--spec", metavar="PATH",
+                        help="use a local api.json instead of downloading it (offline mode)")
+    parser.add_argument("--spec-url", default=SPECS_PATH,
+                        help="URL of the api.json specs")
+    parser.add_argument("--offline", action="store_true",
+                        help="use the cached specs of --spec-url without any network access")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="directory for cached specs")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="download timeout in seconds")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of workers for rendering and writing files (1 renders serially)")
+    parser.add_argument("--render-pool", choices=RENDER_POOLS, default=RENDER_POOL_PROCESS,
+                        help="worker pool used for rendering when --workers is greater than 1")
+    parser.add_argument("--profile", action="store_true",
+                        help="print wall and CPU time of every generation phase")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="number of the slowest types and methods listed by --profile")
+    parser.add_argument("--profile-output", metavar="PATH",
+                        help="dump cProfile stats of the whole run into a pstats file")
+    parser.add_argument("--target", metavar="BASE_PACKAGE:OUTDIR", type=parse_target, action="append",
+                        help="base package and output directory to generate into; repeat it to render "
+                        f"one parsed spec into several targets (default: {BASE_PACKAGE_NAME}:{DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--fsync", choices=FSYNC_MODES, default=FSYNC_NONE,
+                        help="none (default) leaves flushing to the OS; file fsyncs every file as it is "
+                        "written; batch fsyncs the output files once after all of them are written. file and "
+                        "batch also fsync the directories and the swap, so the new output survives a power loss "
+                        "once the run ends")
+    parser.add_argument("--java-records", action="store_true",
+                        help="generate Java records instead of classes with hand-written equals, hashCode and toString")
+    parser.add_argument("--cache-hash", action="store_true",
+                        help="cache hashCode of generated data classes; instances must not be changed after "
+                        "Builder.build() or deserialization (ignored with --java-records)")
+    parser.add_argument("--only", metavar="NAMES", type=parse_names, action="extend",
+                        help="comma-separated methods and types to generate; everything they depend on "
+                        "is generated too and BotApi gets only the listed methods")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep the parsed model in memory and regenerate whenever the --spec file changes")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between checks of the spec file in watch mode")
+    return parser.parse_args()
+
+
+def generate(args: Namespace, profiler: Profiler) -> list[WriteSummary]:
+    with profiler.phase("download"):
+        api_json_file = download_specs(args)
+
+    targets = args.target or [(DEFAULT_OUTPUT_DIR, BASE_PACKAGE_NAME)]
+
+    with profiler.phase("parse"):
+        with open(api_json_file, "r") as file:
+            api_specs = SpecView(json.load(file))
+
+    outdir, base_packagename = targets[0]
+    writer = CodeWriter(outdir, base_packagename, workers=args.workers, render_pool=args.render_pool,
+                        profiler=profiler, selection=make_selection(args), output_mode=output_mode(args),
+                        fsync=args.fsync, cached_hash=args.cache_hash)
+
+    with profiler.phase("type registration"):
+        register_specs(writer, api_specs)
+
+    return writer.write_targets(targets)
+
+
+def register_specs(writer: CodeWriter, specs: Mapping) -> None:
+    add_datatypes(writer, specs)
+    add_method_params(writer, specs)
+    add_methods(writer, specs)
+
+
+def watch(args: Namespace) -> None:
+    if args.spec is None:
+        raise Exception("Watch mode needs a local spec passed with --spec!")
+
+    targets = args.target or [(DEFAULT_OUTPUT_DIR, BASE_PACKAGE_NAME)]
+    outdir, base_packagename = targets[0]
+
+    def make_writer(body_cache: dict[tuple, str]) -> CodeWriter:
+        return CodeWriter(outdir, base_packagename, workers=args.workers, render_pool=args.render_pool,
+                          body_cache=body_cache, selection=make_selection(args), output_mode=output_mode(args),
+                          fsync=args.fsync, cached_hash=args.cache_hash)
+
+    SpecWatcher(args.spec, targets, register_specs, make_writer, args.poll_interval).watch()
 
-        writer = CodeWriter(output_dir)
 
-        add_datatypes(writer, api_specs)
-        add_method_params(writer, api_specs)
-        add_methods(writer, api_specs)
-
-        writer.write_all()
+if __name__ == "__main__":
+    args = parse_args()
+    if args.watch:
+        watch(args)
+        sys.exit(0)
+
+    profiler = Profiler(enabled=args.profile)
+
+    if args.profile_output is not None:
+        stats_profiler = cProfile.Profile()
+        summaries = stats_profiler.runcall(generate, args, profiler)
+        stats_profiler.dump_stats(args.profile_output)
+    else:
+        summaries = generate(args, profiler)
+
+    for (outdir, _), summary in zip(args.target or [(DEFAULT_OUTPUT_DIR, None)], summaries):
+        print(f"{outdir}: {summary}")
+    if args.profile:
+        profiler.record_cache("type mapping", TYPE_MAPPER.hits, TYPE_MAPPER.misses)
+        print(profiler.report(args.profile_top))
@@ -0,0 +1,90 @@
+from tempfile import TemporaryDirectory
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from writer.manifest import Manifest
+from writer.output import DirectoryOutput
+
+
+class DirectoryOutputTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.outdir = os.path.join(self.tmpdir.name, "output")
+        os.makedirs(os.path.join(self.outdir, "types"))
+        with open(os.path.join(self.outdir, "types", "Old.java"), "w") as file:
+            file.write("old")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def regenerate(self) -> None:
+        output = DirectoryOutput(self.outdir)
+        output.begin()
+        previous_manifest = Manifest.load(self.outdir)
+        manifest = Manifest(self.outdir)
+        try:
+            output.write("types/New.java", "new")
+            manifest.record("types/New.java", "content", "spec")
+            output.commit(manifest, previous_manifest)
+        except BaseException:
+            output.abort()
+            raise
+
+    def test_keeps_empty_directories(self) -> None:
+        os.makedirs(os.path.join(self.outdir, "emptydir", "nested"))
+
+        self.regenerate()
+
+        self.assertTrue(os.path.isdir(os.path.join(self.outdir, "emptydir", "nested")))
+        self.assertTrue(os.path.isfile(os.path.join(self.outdir, "types", "New.java")))
+
+    def test_keeps_symlinks(self) -> None:
+        target = os.path.join(self.tmpdir.name, "shared")
+        os.makedirs(target)
+        with open(os.path.join(target, "Shared.java"), "w") as file:
+            file.write("shared")
+        os.symlink(target, os.path.join(self.outdir, "linkdir"))
+        os.symlink("Old.java", os.path.join(self.outdir, "types", "Link.java"))
+
+        self.regenerate()
+
+        self.assertTrue(os.path.islink(os.path.join(self.outdir, "linkdir")))
+        self.assertEqual(os.readlink(os.path.join(self.outdir, "linkdir")), target)
+        self.assertTrue(os.path.isfile(os.path.join(target, "Shared.java")))
+        self.assertEqual(os.readlink(os.path.join(self.outdir, "types", "Link.java")), "Old.java")
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs FIFOs")
+    def test_refuses_to_swap_entries_it_cannot_carry_over(self) -> None:
+        os.mkfifo(os.path.join(self.outdir, "pipe"))
+
+        with self.assertRaises(Exception):
+            self.regenerate()
+
+        self.assertTrue(os.path.exists(os.path.join(self.outdir, "pipe")))
+        self.assertTrue(os.path.isfile(os.path.join(self.outdir, "types", "Old.java")))
+        self.assertFalse(os.path.exists(self.outdir + ".staging"))
+
+    def test_recovers_backup_of_interrupted_swap(self) -> None:
+        os.rename(self.outdir, self.outdir + ".previous")
+
+        self.regenerate()
+
+        self.assertTrue(os.path.isfile(os.path.join(self.outdir, "types", "Old.java")))
+        self.assertFalse(os.path.exists(self.outdir + ".previous"))
+
+    def test_rejects_current_directory(self) -> None:
+        cwd = os.getcwd()
+        os.chdir(self.outdir)
+        try:
+            with self.assertRaises(Exception):
+                DirectoryOutput(".").begin()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    unittest.main()
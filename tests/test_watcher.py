@@ -0,0 +1,92 @@
+from tempfile import TemporaryDirectory
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import register_specs
+from writer.code_writer import CodeWriter
+from writer.watcher import SpecWatcher
+
+
+def make_type(name: str) -> dict:
+    return {
+        "name": name,
+        "href": "",
+        "description": [f"{name} type."],
+        "fields": [{"name": "text", "types": ["String"], "required": True, "description": "Text."}],
+    }
+
+
+def make_method(name: str) -> dict:
+    return {
+        "name": name,
+        "href": "",
+        "description": [f"{name} method."],
+        "returns": ["True"],
+        "fields": [
+            {"name": "chat_id", "types": ["Integer"], "required": True, "description": "Chat."},
+            {"name": "reply_markup", "types": ["A1", "A2", "A3"], "required": False, "description": "Markup."},
+        ],
+    }
+
+
+def make_specs(method_names: list[str]) -> dict:
+    return {
+        "types": {name: make_type(name) for name in ["A1", "A2", "A3"]},
+        "methods": {name: make_method(name) for name in method_names},
+    }
+
+
+def read_tree(outdir: str) -> dict[str, str]:
+    files = {}
+    for dirpath, _, filenames in os.walk(outdir):
+        for filename in filenames:
+            if filename.endswith(".java"):
+                path = os.path.join(dirpath, filename)
+                with open(path, "r") as file:
+                    files[os.path.relpath(path, outdir)] = file.read()
+    return files
+
+
+class SpecWatcherTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = TemporaryDirectory()
+        self.spec_path = os.path.join(self.tmpdir.name, "api.json")
+        self.outdir = os.path.join(self.tmpdir.name, "output") + "/"
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def write_specs(self, method_names: list[str]) -> None:
+        with open(self.spec_path, "w") as file:
+            json.dump(make_specs(method_names), file)
+
+    def generate_fresh(self, method_names: list[str]) -> dict[str, str]:
+        outdir = os.path.join(self.tmpdir.name, "fresh") + "/"
+        writer = CodeWriter(outdir)
+        register_specs(writer, make_specs(method_names))
+        writer.write_all()
+        return read_tree(outdir)
+
+    def test_deleted_parameters_entry_keeps_shared_interface(self) -> None:
+        watcher = SpecWatcher(self.spec_path, [(self.outdir, "jarkz.tbot")], register_specs,
+                              lambda bodies: CodeWriter(self.outdir, body_cache=bodies))
+
+        self.write_specs(["methodA", "methodB"])
+        watcher.regenerate()
+
+        # methodA created the ReplyMarkup interface, which methodB reused.
+        self.write_specs(["methodB"])
+        watcher.regenerate()
+
+        generated = read_tree(self.outdir)
+        self.assertIn(os.path.join("types", "ReplyMarkup.java"), generated)
+        self.assertEqual(self.generate_fresh(["methodB"]), generated)
+
+
+if __name__ == "__main__":
+    unittest.main()
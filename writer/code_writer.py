@@ -1,51 +1,256 @@
 import os
-from generators.methodgen import MethodGenerator
-from generators.typegen import TypeGenerator, TypeClassification
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from time import perf_counter
+from typing import Iterable, Mapping, cast
+from generators.helpers import hash_content
+from generators.methodgen import Method, MethodGenerator
+from generators.profiler import DISABLED_PROFILER, Profiler
+from generators.selection import Selection
+from generators.typegen import GenerationContext, OutputMode, Type, TypeGenerator, TypeClassification, TypeRegistry
+from writer.manifest import Manifest, WriteSummary
+from writer.output import ArchiveOutput, DirectoryOutput, FSYNC_NONE, open_output
 
 
 BASE_PACKAGE_NAME = "jarkz.tbot"
 
+RENDER_POOL_PROCESS = "process"
+RENDER_POOL_THREAD = "thread"
+RENDER_POOLS = [RENDER_POOL_PROCESS, RENDER_POOL_THREAD]
+
+GENERATORS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "generators")
+
+BOT_API_PATH = "core/BotApi.java"
+
+
+def type_path(type_: Type) -> str:
+    return type_.type_classification.package().replace(".", "/") + "/" + type_.name + ".java"
+
+
+def generator_fingerprint() -> str:
+    # A change in the generators changes the output of an unchanged spec too.
+    sources = []
+    for filename in sorted(os.listdir(GENERATORS_DIRECTORY)):
+        if filename.endswith(".py"):
+            with open(os.path.join(GENERATORS_DIRECTORY, filename), "r") as file:
+                sources.append(file.read())
+    return hash_content("".join(sources))
+
+
+def render_type(type_: Type, mode: OutputMode = OutputMode.Classes) -> tuple[str, float]:
+    start = perf_counter()
+    content = type_.java_body(mode)
+    return (content, perf_counter() - start)
+
+
+class WriteTarget:
+    outdir: str
+    base_packagename: str
+    output: DirectoryOutput | ArchiveOutput
+    manifest: Manifest
+    previous_manifest: Manifest
+    summary: WriteSummary
+
+    def __init__(self, outdir: str, base_packagename: str, fsync: str = FSYNC_NONE) -> None:
+        self.outdir = outdir
+        self.base_packagename = base_packagename
+        self.output = open_output(outdir, base_packagename, fsync)
+        self.output.begin()
+        self.previous_manifest = Manifest.load(outdir)
+        self.manifest = Manifest(outdir)
+        self.summary = WriteSummary()
+
 
 class CodeWriter:
+    context: GenerationContext
     type_geneartor: TypeGenerator
     method_generator: MethodGenerator
     outdir: str
     base_packagename: str
+    workers: int
+    render_pool: str
+    profiler: Profiler
+    resolved_types: TypeRegistry | None
+    body_cache: dict[tuple, str] | None
+    selection: Selection | None
+    output_mode: OutputMode
+    fsync: str
+    fingerprint: str
 
-    def __init__(self, outdir: str, base_packagename: str = BASE_PACKAGE_NAME) -> None:
+    def __init__(self, outdir: str, base_packagename: str = BASE_PACKAGE_NAME,
+                 workers: int = 1, render_pool: str = RENDER_POOL_PROCESS,
+                 profiler: Profiler = DISABLED_PROFILER, body_cache: dict[tuple, str] | None = None,
+                 selection: Selection | None = None, output_mode: OutputMode = OutputMode.Classes,
+                 fsync: str = FSYNC_NONE, cached_hash: bool = False) -> None:
         self.outdir = outdir
-        self.type_geneartor = TypeGenerator(base_packagename)
-        self.method_generator = MethodGenerator()
+        self.profiler = profiler
+        self.context = GenerationContext(cached_hash)
+        self.type_geneartor = TypeGenerator(self.context, profiler)
+        self.method_generator = MethodGenerator(profiler)
         self.base_packagename = base_packagename
+        self.workers = workers
+        self.render_pool = render_pool
+        self.resolved_types = None
+        self.body_cache = body_cache
+        self.selection = selection
+        self.output_mode = output_mode
+        self.fsync = fsync
+        self.fingerprint = generator_fingerprint()
+
+    def add_type(self, type_: Mapping, type_classification: TypeClassification) -> Type:
+        return self.type_geneartor.add_type(type_, type_classification)
+
+    def add_method(self, raw_method: Mapping) -> Method:
+        return self.method_generator.add_method(raw_method)
+
+    def __write_file(self, target: WriteTarget, path: str, content: str, spec_hash: str) -> None:
+        content_hash = hash_content(content)
+        target.manifest.record(path, content_hash, spec_hash)
+
+        if target.previous_manifest.is_unchanged(path, content_hash) and target.output.exists(path):
+            target.output.keep(path)
+            target.summary.skipped.append(path)
+            return
+
+        target.output.write(path, content)
+        target.summary.written.append(path)
+
+    def __render_executor(self) -> Executor | None:
+        if self.workers <= 1:
+            return None
+        if self.render_pool == RENDER_POOL_PROCESS:
+            return ProcessPoolExecutor(self.workers)
+        return ThreadPoolExecutor(self.workers)
+
+    def __render_types(self, types: TypeRegistry, executor: Executor | None) -> Iterable[tuple[str, float]]:
+        if executor is None:
+            return [render_type(type_, self.output_mode) for type_ in types]
+
+        chunksize = max(1, len(types) // (self.workers * 4))
+        return executor.map(render_type, types, repeat(self.output_mode), chunksize=chunksize)
+
+    def __write_files(self, target: WriteTarget, files: dict[str, tuple[str, str]]) -> None:
+        if self.workers <= 1 or not target.output.parallel_writes:
+            for path, (content, spec_hash) in files.items():
+                self.__write_file(target, path, content, spec_hash)
+            return
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = [executor.submit(self.__write_file, target, path, content, spec_hash)
+                       for path, (content, spec_hash) in files.items()]
+            for future in futures:
+                future.result()
+
+    def resolve(self) -> TypeRegistry:
+        if self.resolved_types is None:
+            self.resolved_types = self.type_geneartor.types()
+            if self.selection is not None:
+                with self.profiler.phase("selection"):
+                    self.resolved_types, methods = self.selection.apply(
+                        self.resolved_types, self.method_generator.methods)
+                    self.method_generator.retain(methods)
+            with self.profiler.phase("input file analysis"):
+                self.method_generator.set_types(self.resolved_types)
+
+        return self.resolved_types
+
+    def __render_bodies(self, types: TypeRegistry) -> list[str]:
+        if self.body_cache is None:
+            to_render = types
+        else:
+            to_render = TypeRegistry(filter(lambda type_: type_.render_key() not in self.body_cache, types))
+
+        executor = self.__render_executor()
+        with executor or nullcontext():
+            bodies = []
+            for type_, (body, seconds) in zip(to_render, self.__render_types(to_render, executor)):
+                bodies.append(body)
+                self.profiler.record("types", type_.name, seconds)
+
+        if self.body_cache is None:
+            return bodies
+
+        for type_, body in zip(to_render, bodies):
+            self.body_cache[type_.render_key()] = body
+        return list(map(lambda type_: cast(dict, self.body_cache)[type_.render_key()], types))
+
+    def __input_hash(self, base_packagename: str, *inputs: object) -> str:
+        return hash_content(repr((self.fingerprint, base_packagename, self.output_mode, inputs)))
+
+    def __type_input_hash(self, type_: Type, base_packagename: str) -> str:
+        return self.__input_hash(base_packagename, type_.render_key(), sorted(type_.collect_imports(self.output_mode)))
+
+    def __bot_api_input_hash(self, types: TypeRegistry, base_packagename: str) -> str:
+        render_keys = list(map(lambda type_: type_.render_key(), types))
+        return self.__input_hash(base_packagename, self.method_generator.spec_hash(), render_keys)
+
+    def __keep_unchanged(self, target: WriteTarget, path: str, spec_hash: str) -> bool:
+        content_hash = target.previous_manifest.reusable_content(path, spec_hash)
+        if content_hash is None or not target.output.exists(path):
+            return False
+
+        target.manifest.record(path, content_hash, spec_hash)
+        target.output.keep(path)
+        target.summary.skipped.append(path)
+        return True
+
+    def write_targets(self, targets: list[tuple[str, str]]) -> list[WriteSummary]:
+        types = self.resolve()
+
+        write_targets: list[WriteTarget] = []
+        try:
+            for outdir, base_packagename in targets:
+                write_targets.append(WriteTarget(outdir, base_packagename, self.fsync))
+
+            # Types rendered from the same input as last time are kept without rendering.
+            changed: list[list[tuple[Type, str]]] = []
+            for target in write_targets:
+                changed.append([])
+                for type_ in types:
+                    spec_hash = self.__type_input_hash(type_, target.base_packagename)
+                    if not self.__keep_unchanged(target, type_path(type_), spec_hash):
+                        changed[-1].append((type_, spec_hash))
+
+            needed = set(id(type_) for target_changed in changed for type_, _ in target_changed)
+            to_render = TypeRegistry(filter(lambda type_: id(type_) in needed, types))
+            with self.profiler.phase("rendering"):
+                bodies = dict(zip(map(id, to_render), self.__render_bodies(to_render)))
+
+            # Methods are rendered once per target, but timed only the first time.
+            profile_methods = True
+            for index, target in enumerate(write_targets):
+                if self.__write_target(target, types, changed[index], bodies, profile_methods):
+                    profile_methods = False
+        except BaseException:
+            for target in write_targets:
+                target.output.abort()
+            raise
 
-    def add_type(self, type_: dict, type_classification: TypeClassification):
-        self.type_geneartor.add_type(type_, type_classification)
+        return list(map(lambda target: target.summary, write_targets))
 
-    def add_method(self, raw_method: dict):
-        self.method_generator.add_method(raw_method)
+    def __write_target(self, target: WriteTarget, types: TypeRegistry, changed: list[tuple[Type, str]],
+                       bodies: dict[int, str], profile_methods: bool) -> bool:
+        base_packagename = target.base_packagename
 
-    @staticmethod
-    def mkdir_if_missing(path: str):
-        if not os.path.exists(path):
-            os.makedirs(path)
+        with self.profiler.phase("rendering"):
+            files: dict[str, tuple[str, str]] = {}
+            for type_, spec_hash in changed:
+                header = type_.java_header(base_packagename, self.output_mode)
+                files[type_path(type_)] = (header + bodies[id(type_)], spec_hash)
 
-    def write_all(self):
-        types = self.type_geneartor.types()
-        for type_ in types:
-            extended_path = self.outdir + \
-                type_.type_classification.package().replace(".", "/") + "/"
+            spec_hash = self.__bot_api_input_hash(types, base_packagename)
+            if not self.__keep_unchanged(target, BOT_API_PATH, spec_hash):
+                bot_api = self.method_generator.build_java_class(base_packagename, self.output_mode, profile_methods)
+                files[BOT_API_PATH] = (bot_api, spec_hash)
 
-            CodeWriter.mkdir_if_missing(extended_path)
+        with self.profiler.phase("writing"):
+            self.__write_files(target, files)
 
-            filename = extended_path + type_.name + ".java"
-            with open(filename, "w") as java_file:
-                java_file.writelines(type_.to_java_code(self.base_packagename))
+            target.summary.removed.extend(target.previous_manifest.stale_paths(target.manifest))
+            target.output.commit(target.manifest, target.previous_manifest)
 
-        methods_path = self.outdir + "/core/"
-        CodeWriter.mkdir_if_missing(methods_path)
-        filename = methods_path + "BotApi.java"
-        with open(filename, "w") as java_file:
-            self.method_generator.set_types(types)
-            java_file.writelines(
-                self.method_generator.build_java_class(self.base_packagename))
+        return BOT_API_PATH in files
 
+    def write_all(self) -> WriteSummary:
+        return self.write_targets([(self.outdir, self.base_packagename)])[0]
@@ -0,0 +1,88 @@
+import json
+import os
+
+MANIFEST_FILENAME = ".manifest.json"
+MANIFEST_VERSION = 2
+
+
+class ManifestEntry:
+    content_hash: str
+    spec_hash: str
+
+    def __init__(self, content_hash: str, spec_hash: str) -> None:
+        self.content_hash = content_hash
+        self.spec_hash = spec_hash
+
+    def as_dict(self) -> dict:
+        return {"content": self.content_hash, "spec": self.spec_hash}
+
+
+class Manifest:
+    path: str
+    entries: dict[str, ManifestEntry]
+
+    def __init__(self, outdir: str) -> None:
+        self.path = os.path.join(outdir, MANIFEST_FILENAME)
+        self.entries = {}
+
+    @staticmethod
+    def load(outdir: str) -> "Manifest":
+        manifest = Manifest(outdir)
+        if not os.path.exists(manifest.path):
+            return manifest
+
+        try:
+            with open(manifest.path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get("version") != MANIFEST_VERSION:
+            return manifest
+
+        for path, entry in data.get("files", {}).items():
+            manifest.entries[path] = ManifestEntry(entry["content"], entry["spec"])
+
+        return manifest
+
+    def is_unchanged(self, path: str, content_hash: str) -> bool:
+        entry = self.entries.get(path)
+        return entry is not None and entry.content_hash == content_hash
+
+    def reusable_content(self, path: str, spec_hash: str) -> str | None:
+        # Content hash of a file rendered from the very same input, if any.
+        entry = self.entries.get(path)
+        if entry is None or entry.spec_hash != spec_hash:
+            return None
+        return entry.content_hash
+
+    def record(self, path: str, content_hash: str, spec_hash: str) -> None:
+        self.entries[path] = ManifestEntry(content_hash, spec_hash)
+
+    def stale_paths(self, current: "Manifest") -> list[str]:
+        return sorted(path for path in self.entries if path not in current.entries)
+
+    def save(self, outdir: str | None = None) -> str:
+        path = self.path if outdir is None else os.path.join(outdir, MANIFEST_FILENAME)
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": {path: self.entries[path].as_dict() for path in sorted(self.entries)},
+        }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+            file.write("\n")
+        return path
+
+
+class WriteSummary:
+    written: list[str]
+    skipped: list[str]
+    removed: list[str]
+
+    def __init__(self) -> None:
+        self.written = []
+        self.skipped = []
+        self.removed = []
+
+    def __str__(self) -> str:
+        return f"Files written: {len(self.written)}, skipped: {len(self.skipped)}, removed: {len(self.removed)}"
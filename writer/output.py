@@ -0,0 +1,252 @@
+from threading import Lock
+from time import gmtime
+from typing import cast
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+import os
+import shutil
+
+from writer.manifest import MANIFEST_FILENAME, Manifest
+
+FSYNC_NONE = "none"
+FSYNC_FILE = "file"
+FSYNC_BATCH = "batch"
+FSYNC_MODES = [FSYNC_NONE, FSYNC_FILE, FSYNC_BATCH]
+
+STAGING_SUFFIX = ".staging"
+BACKUP_SUFFIX = ".previous"
+
+ARCHIVE_SUFFIXES = (".zip", ".jar")
+JAR_MANIFEST = "Manifest-Version: 1.0\r\nCreated-By: tbot_type_generator\r\n\r\n"
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def archive_timestamp() -> tuple[int, int, int, int, int, int]:
+    source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if source_date_epoch is None:
+        return ZIP_EPOCH
+    return max(ZIP_EPOCH, tuple(gmtime(int(source_date_epoch))[:6]))
+
+
+class DirectoryOutput:
+    parallel_writes = True
+    outdir: str
+    staging: str
+    backup: str
+    fsync: str
+    directories: set[str]
+    kept: list[str]
+    written: list[str]
+    linked: list[str]
+    lock: Lock
+
+    def __init__(self, outdir: str, fsync: str = FSYNC_NONE) -> None:
+        self.outdir = os.path.normpath(outdir)
+        self.staging = self.outdir + STAGING_SUFFIX
+        self.backup = self.outdir + BACKUP_SUFFIX
+        self.fsync = fsync
+        self.directories = set()
+        self.kept = []
+        self.written = []
+        self.linked = []
+        self.lock = Lock()
+
+    def __ensure_directory(self, directory: str) -> None:
+        if directory in self.directories:
+            return
+
+        with self.lock:
+            if directory not in self.directories:
+                os.makedirs(directory, exist_ok=True)
+                self.directories.add(directory)
+
+    def __staged(self, path: str) -> str:
+        filename = os.path.join(self.staging, path)
+        self.__ensure_directory(os.path.dirname(filename))
+        return filename
+
+    def begin(self) -> None:
+        outdir = os.path.abspath(self.outdir)
+        if outdir == os.getcwd() or os.path.ismount(outdir):
+            raise Exception(f"Output directory {self.outdir} can't be swapped, use a subdirectory instead!")
+
+        # A run interrupted in the middle of the swap leaves only the backup behind.
+        if not os.path.exists(self.outdir) and os.path.isdir(self.backup):
+            os.rename(self.backup, self.outdir)
+
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+    def exists(self, path: str) -> bool:
+        return os.path.isfile(os.path.join(self.outdir, path))
+
+    def keep(self, path: str) -> None:
+        with self.lock:
+            self.kept.append(path)
+
+    def __link(self, path: str) -> None:
+        source = os.path.join(self.outdir, path)
+        filename = self.__staged(path)
+        try:
+            os.link(source, filename)
+        except OSError:
+            shutil.copy2(source, filename)
+        self.linked.append(filename)
+
+    def write(self, path: str, content: str) -> None:
+        filename = self.__staged(path)
+        with open(filename, "w") as file:
+            file.write(content)
+            if self.fsync == FSYNC_FILE:
+                file.flush()
+                os.fsync(file.fileno())
+
+        with self.lock:
+            self.written.append(filename)
+
+    def __copy_symlink(self, path: str) -> None:
+        filename = self.__staged(path)
+        os.symlink(os.readlink(os.path.join(self.outdir, path)), filename)
+
+    def __keep_untracked_files(self, manifest: Manifest, previous_manifest: Manifest) -> None:
+        if not os.path.isdir(self.outdir):
+            return
+
+        # Linked directories are listed in dirnames, but os.walk doesn't descend into them.
+        for root, dirnames, filenames in os.walk(self.outdir):
+            for dirname in dirnames:
+                path = os.path.relpath(os.path.join(root, dirname), self.outdir)
+                if os.path.islink(os.path.join(root, dirname)):
+                    self.__copy_symlink(path)
+                else:
+                    self.__ensure_directory(os.path.join(self.staging, path))
+
+            for filename in filenames:
+                source = os.path.join(root, filename)
+                path = os.path.relpath(source, self.outdir).replace(os.sep, "/")
+                if path == MANIFEST_FILENAME or path in manifest.entries or path in previous_manifest.entries:
+                    continue
+
+                if os.path.islink(source):
+                    self.__copy_symlink(path)
+                elif os.path.isfile(source):
+                    self.__link(path)
+                else:
+                    raise Exception(f"Can't carry {source} over into the new output, move it out of {self.outdir}!")
+
+    def __sync(self, manifest_path: str) -> None:
+        if self.fsync == FSYNC_NONE:
+            return
+
+        # Batch mode flushes the files of this output once, after all of them are written.
+        if self.fsync == FSYNC_BATCH:
+            for filename in self.written + self.linked:
+                fsync_path(filename)
+        fsync_path(manifest_path)
+        for directory in self.directories:
+            fsync_path(directory)
+
+    def __save_manifest_in_place(self, manifest: Manifest) -> None:
+        self.__ensure_directory(self.staging)
+        staged_manifest = manifest.save(self.staging)
+        if self.fsync != FSYNC_NONE:
+            fsync_path(staged_manifest)
+
+        os.replace(staged_manifest, os.path.join(self.outdir, MANIFEST_FILENAME))
+        self.abort()
+
+    def commit(self, manifest: Manifest, previous_manifest: Manifest) -> None:
+        # Nothing to swap when every file is kept as is.
+        if not self.written and not previous_manifest.stale_paths(manifest) and os.path.isdir(self.outdir):
+            self.__save_manifest_in_place(manifest)
+            return
+
+        self.__ensure_directory(self.staging)
+        for path in self.kept:
+            self.__link(path)
+        self.__keep_untracked_files(manifest, previous_manifest)
+        self.__sync(manifest.save(self.staging))
+
+        if os.path.exists(self.outdir):
+            shutil.rmtree(self.backup, ignore_errors=True)
+            os.rename(self.outdir, self.backup)
+            os.rename(self.staging, self.outdir)
+            shutil.rmtree(self.backup)
+        else:
+            os.rename(self.staging, self.outdir)
+
+        if self.fsync != FSYNC_NONE:
+            fsync_path(os.path.dirname(os.path.abspath(self.outdir)))
+
+    def abort(self) -> None:
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+class ArchiveOutput:
+    parallel_writes = False
+    path: str
+    prefix: str
+    fsync: str
+    timestamp: tuple[int, int, int, int, int, int]
+    temporary: str
+    archive: ZipFile | None
+
+    def __init__(self, path: str, base_packagename: str, fsync: str = FSYNC_NONE) -> None:
+        self.path = path
+        self.prefix = base_packagename.replace(".", "/") + "/"
+        self.fsync = fsync
+        self.timestamp = archive_timestamp()
+        self.temporary = path + STAGING_SUFFIX
+        self.archive = None
+
+    def __entry(self, name: str, content: str) -> None:
+        info = ZipInfo(name, self.timestamp)
+        info.create_system = 3
+        info.external_attr = 0o644 << 16
+        info.compress_type = ZIP_DEFLATED
+        cast(ZipFile, self.archive).writestr(info, content)
+
+    def begin(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.archive = ZipFile(self.temporary, "w")
+        if self.path.endswith(".jar"):
+            self.__entry("META-INF/MANIFEST.MF", JAR_MANIFEST)
+
+    def exists(self, path: str) -> bool:
+        return False
+
+    def keep(self, path: str) -> None:
+        raise Exception("Archive output rewrites every file!")
+
+    def write(self, path: str, content: str) -> None:
+        self.__entry(self.prefix + path, content)
+
+    def commit(self, manifest: Manifest, previous_manifest: Manifest) -> None:
+        cast(ZipFile, self.archive).close()
+        if self.fsync != FSYNC_NONE:
+            fsync_path(self.temporary)
+
+        os.replace(self.temporary, self.path)
+        if self.fsync != FSYNC_NONE:
+            fsync_path(os.path.dirname(os.path.abspath(self.path)))
+
+    def abort(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+        if os.path.exists(self.temporary):
+            os.remove(self.temporary)
+
+
+def open_output(outdir: str, base_packagename: str, fsync: str = FSYNC_NONE) -> DirectoryOutput | ArchiveOutput:
+    if outdir.endswith(ARCHIVE_SUFFIXES):
+        return ArchiveOutput(outdir, base_packagename, fsync)
+    return DirectoryOutput(outdir, fsync)
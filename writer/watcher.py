@@ -0,0 +1,206 @@
+from time import perf_counter, sleep
+from typing import Callable, Mapping
+import json
+import os
+
+from generators.helpers import hash_spec
+from generators.methodgen import Method
+from generators.spec_view import SpecView
+from generators.typegen import Type, TypeClassification
+from writer.code_writer import CodeWriter
+from writer.manifest import WriteSummary
+
+DEFAULT_POLL_INTERVAL = 0.2
+
+
+class ParsedParameters:
+    spec_hash: str
+    type_: Type
+    grouped_interfaces: list[Type]
+    specific_types: list[tuple[frozenset[str], str]]
+
+    def __init__(self, spec_hash: str, type_: Type, grouped_interfaces: list[Type],
+                 specific_types: list[tuple[frozenset[str], str]]) -> None:
+        self.spec_hash = spec_hash
+        self.type_ = type_
+        self.grouped_interfaces = grouped_interfaces
+        self.specific_types = specific_types
+
+
+class ModelCache:
+    datatypes: dict[str, tuple[str, Type]]
+    parameters: dict[str, ParsedParameters]
+    parameter_order: list[str]
+    methods: dict[str, tuple[str, Method]]
+    bodies: dict[tuple, str]
+
+    def __init__(self) -> None:
+        self.datatypes = {}
+        self.parameters = {}
+        self.parameter_order = []
+        self.methods = {}
+        self.bodies = {}
+
+    def retain(self, names: set[str], render_keys: set[tuple]) -> None:
+        self.datatypes = {name: entry for name, entry in self.datatypes.items() if name in names}
+        self.parameters = {name: entry for name, entry in self.parameters.items() if name in names}
+        self.methods = {name: entry for name, entry in self.methods.items() if name in names}
+        for key in [key for key in self.bodies if key not in render_keys]:
+            del self.bodies[key]
+
+
+class CachingWriter:
+    cache: ModelCache
+    writer: CodeWriter
+    seen: set[str]
+    reparsed: list[str]
+    parameter_order: list[str]
+    parameters_changed: bool
+
+    def __init__(self, cache: ModelCache, writer: CodeWriter) -> None:
+        self.cache = cache
+        self.writer = writer
+        self.seen = set()
+        self.reparsed = []
+        self.parameter_order = []
+        self.parameters_changed = False
+
+    def __add_datatype(self, telegram_type: Mapping) -> None:
+        spec_hash = hash_spec(telegram_type)
+        cached = self.cache.datatypes.get(telegram_type["name"])
+
+        if cached is None or cached[0] != spec_hash:
+            type_ = Type(telegram_type, TypeClassification.DataType, self.writer.context)
+            cached = (spec_hash, type_)
+            self.cache.datatypes[type_.name] = cached
+            self.reparsed.append(type_.name)
+
+        self.writer.type_geneartor.add_parsed_type(cached[1].clone())
+
+    def __add_parameters(self, telegram_type: Mapping) -> None:
+        context = self.writer.context
+        spec_hash = hash_spec(telegram_type)
+        cached = self.cache.parameters.get(telegram_type["name"])
+
+        # An entry removed or moved before this one takes its grouped interfaces with it.
+        position = len(self.parameter_order)
+        self.parameter_order.append(telegram_type["name"])
+        previous_order = self.cache.parameter_order
+        moved = position >= len(previous_order) or previous_order[position] != telegram_type["name"]
+
+        # Parameters parsing depends on the grouped interfaces created by the previous
+        # parameters, so everything after the first changed entry is parsed again.
+        if cached is None or cached.spec_hash != spec_hash or moved or self.parameters_changed:
+            self.parameters_changed = True
+            interfaces_before = len(context.grouped_interfaces)
+            specific_types_before = len(context.specific_types)
+
+            type_ = Type(telegram_type, TypeClassification.MethodParameters, context)
+            cached = ParsedParameters(
+                spec_hash,
+                type_,
+                context.grouped_interfaces[interfaces_before:],
+                list(context.specific_types.items())[specific_types_before:])
+            self.cache.parameters[type_.name] = cached
+            self.reparsed.append(type_.name)
+        else:
+            context.grouped_interfaces.extend(map(lambda interface: interface.clone(), cached.grouped_interfaces))
+            context.specific_types.update(cached.specific_types)
+
+        self.writer.type_geneartor.add_parsed_type(cached.type_.clone())
+
+    def add_type(self, telegram_type: Mapping, type_classification: TypeClassification) -> None:
+        self.seen.add(telegram_type["name"])
+        match type_classification:
+            case TypeClassification.DataType:
+                self.__add_datatype(telegram_type)
+            case TypeClassification.MethodParameters:
+                self.__add_parameters(telegram_type)
+            case _:
+                raise Exception("Non-exhaustive enum TypeClassification!")
+
+    def add_method(self, raw_method: Mapping) -> None:
+        self.seen.add(raw_method["name"])
+        spec_hash = hash_spec(raw_method)
+        cached = self.cache.methods.get(raw_method["name"])
+
+        if cached is None or cached[0] != spec_hash:
+            cached = (spec_hash, Method(raw_method))
+            self.cache.methods[raw_method["name"]] = cached
+
+        self.writer.method_generator.add_parsed_method(cached[1])
+
+
+class SpecWatcher:
+    spec_path: str
+    targets: list[tuple[str, str]]
+    register: Callable[[CachingWriter, Mapping], None]
+    make_writer: Callable[[dict[tuple, str]], CodeWriter]
+    cache: ModelCache
+    poll_interval: float
+
+    def __init__(self, spec_path: str, targets: list[tuple[str, str]],
+                 register: Callable[[CachingWriter, Mapping], None],
+                 make_writer: Callable[[dict[tuple, str]], CodeWriter],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.spec_path = spec_path
+        self.targets = targets
+        self.register = register
+        self.make_writer = make_writer
+        self.cache = ModelCache()
+        self.poll_interval = poll_interval
+
+    def __stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.spec_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def regenerate(self) -> list[WriteSummary]:
+        with open(self.spec_path, "r") as file:
+            specs = SpecView(json.load(file))
+
+        writer = CachingWriter(self.cache, self.make_writer(self.cache.bodies))
+        try:
+            self.register(writer, specs)
+        finally:
+            # After a failed run, the entries from the failed one onwards are parsed again.
+            self.cache.parameter_order = writer.parameter_order
+        summaries = writer.writer.write_targets(self.targets)
+
+        render_keys = set(map(lambda type_: type_.render_key(), writer.writer.resolve()))
+        self.cache.retain(writer.seen, render_keys)
+
+        names = set(writer.reparsed)
+        print(f"Reparsed {len(names)} entries: {', '.join(sorted(names)) or '-'}")
+        return summaries
+
+    def __run_once(self) -> None:
+        start = perf_counter()
+        try:
+            summaries = self.regenerate()
+        except Exception as error:
+            print(f"Can't regenerate from {self.spec_path}: {error!r}")
+            return
+
+        elapsed = (perf_counter() - start) * 1000
+        for (outdir, _), summary in zip(self.targets, summaries):
+            print(f"{outdir}: {summary}")
+        print(f"Regenerated in {elapsed:.1f} ms, watching {self.spec_path} for changes...")
+
+    def watch(self) -> None:
+        stamp = self.__stamp()
+        self.__run_once()
+
+        try:
+            while True:
+                sleep(self.poll_interval)
+                current = self.__stamp()
+                if current is None or current == stamp:
+                    continue
+
+                stamp = current
+                self.__run_once()
+        except KeyboardInterrupt:
+            pass